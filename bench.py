@@ -0,0 +1,319 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import typing
+
+import bots
+import catalogue
+import render
+import simulate
+import unionfind
+from game import Board, Dominoes, Game, Play, Player, Point, Rule, TermColor
+
+Setup = typing.Callable[[], typing.Callable[[], object]]
+
+BENCHMARKS: typing.Dict[str, Setup] = {}
+
+
+def benchmark(name: str) -> typing.Callable[[Setup], Setup]:
+    """Registers a setup function, which returns the function to time."""
+    def register(setup: Setup) -> Setup:
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def board(rules: Rule, plays: int, seed: int=0) -> Board:
+    """Returns a board after up to plays random valid plays."""
+    rng = random.Random(seed)
+    board = Board(rules)
+    for _ in range(plays):
+        domino = rng.choice(catalogue.CATALOGUE)
+        placements = board.valid_placements(domino)
+        if placements:
+            x, y, direction = rng.choice(placements)
+            board.play(Play(domino=domino, point=Point(x, y), direction=direction))
+    return board
+
+
+def full_board(rules: Rule, seed: int=0) -> Board:
+    """Returns a board that random plays can no longer extend."""
+    return board(rules, plays=200, seed=seed)
+
+
+for size, rules in (("5x5", Rule.TWO_PLAYERS), ("7x7", Rule.MIGHTY_DUEL)):
+    for stage, make in (
+        ("empty", lambda rules: Board(rules)),
+        ("mid", lambda rules: board(rules, plays=6)),
+        ("full", full_board),
+    ):
+        def valid_plays(rules: Rule=rules, make=make) -> typing.Callable[[], object]:
+            b = make(rules)
+            dominoes = catalogue.CATALOGUE
+            def run() -> None:
+                for domino in dominoes:
+                    b.valid_plays(domino)
+            return run
+        benchmark(f"valid_plays/{size}/{stage}")(valid_plays)
+
+
+@benchmark("points/7x7/full")
+def points() -> typing.Callable[[], object]:
+    b = full_board(Rule.MIGHTY_DUEL | Rule.HARMONY | Rule.MIDDLE_KINGDOM)
+    return b.points
+
+
+@benchmark("render/7x7/full")
+def render_grid() -> typing.Callable[[], object]:
+    grid = full_board(Rule.MIGHTY_DUEL).grid
+    renderer = render.Renderer()
+    return lambda: renderer.grid(grid)
+
+
+@benchmark("unionfind/join_groups/10000")
+def union_find() -> typing.Callable[[], object]:
+    rng = random.Random(0)
+    pairs = [(rng.randrange(10000), rng.randrange(10000)) for _ in range(5000)]
+    def run() -> object:
+        union = unionfind.UnionFind()
+        for x, y in pairs:
+            union.join(x, y)
+        return union.groups()
+    return run
+
+
+@benchmark("arrayunionfind/join_groups/10000")
+def array_union_find() -> typing.Callable[[], object]:
+    rng = random.Random(0)
+    pairs = [(rng.randrange(10000), rng.randrange(10000)) for _ in range(5000)]
+    def run() -> object:
+        union = unionfind.ArrayUnionFind(10000)
+        for x, y in pairs:
+            union.join(x, y)
+        return union.groups()
+    return run
+
+
+@benchmark("dominoes/from_json")
+def from_json() -> typing.Callable[[], object]:
+    return lambda: Dominoes.from_json(catalogue.FILENAME)
+
+
+@benchmark("dominoes/catalogue_load")
+def catalogue_load() -> typing.Callable[[], object]:
+    catalogue.load()
+    return catalogue.load
+
+
+for players, rules in ((2, None), (4, None), (2, Rule.MIGHTY_DUEL)):
+    def game(players: int=players, rules: Rule=rules) -> typing.Callable[[], object]:
+        policies = [bots.RandomPolicy()] * players
+        index = iter(range(sys.maxsize))
+        return lambda: simulate.play(
+            catalogue.CATALOGUE,
+            policies,
+            rules,
+            index=next(index),
+        )
+    name = rules.name.lower() if rules else f"{players}_players"
+    benchmark(f"game/{name}")(game)
+
+
+def mid_game(players: int=4, seed: int=0) -> Game:
+    """Returns a game half way through its turns."""
+    rng = random.Random(seed)
+    game = Game(
+        dominoes=catalogue.CATALOGUE,
+        players=[
+            Player(name=f"Player {i + 1}", color=color)
+            for i, color in zip(range(players), TermColor)
+        ],
+        rng=rng,
+    )
+    policy = bots.RandomPolicy()
+    while game.turn_num <= game.max_turns() // 2:
+        game.step(policy.act(game, rng))
+    return game
+
+
+@benchmark("copy/game")
+def game_copy() -> typing.Callable[[], object]:
+    return mid_game().copy
+
+
+# state needs multiprocessing.shared_memory, new in Python 3.8.
+if sys.version_info >= (3, 8):
+    @benchmark("copy/state")
+    def state_copy() -> typing.Callable[[], object]:
+        import state
+
+        return state.State.from_game(mid_game()).copy
+
+
+def measure(
+    setup: Setup,
+    repeat: int,
+    seconds: float,
+) -> typing.Dict[str, float]:
+    """Times the function from setup, calling it enough times per repeat
+    to take at least seconds."""
+    run = setup()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            break
+        number *= 2
+
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        timings.append((time.perf_counter() - start) / number)
+
+    best = min(timings)
+    return {
+        "best": best,
+        "median": statistics.median(timings),
+        "per_second": 1 / best,
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def run(
+    names: typing.Iterable[str],
+    repeat: int=5,
+    seconds: float=0.2,
+) -> typing.Dict[str, typing.Any]:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": {
+            name: measure(BENCHMARKS[name], repeat, seconds)
+            for name in names
+        },
+    }
+
+
+def import_time(module: str, repeat: int=3) -> float:
+    """Returns the best seconds a new interpreter took to import module."""
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    return min(
+        float(subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        ).stdout)
+        for _ in range(repeat)
+    )
+
+
+def compare(
+    results: typing.Dict[str, typing.Any],
+    baseline: typing.Dict[str, typing.Any],
+    threshold: float,
+) -> typing.List[str]:
+    """Returns the benchmarks more than threshold slower than baseline."""
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+        ratio = result["best"] / baseline["benchmarks"][name]["best"]
+        result["baseline_ratio"] = ratio
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: typing.List[str]=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the engine.")
+    parser.add_argument(
+        "names",
+        nargs="*",
+        help="prefixes of benchmarks to run, all by default",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--seconds",
+        type=float,
+        default=0.2,
+        help="minimum time per repeat",
+    )
+    parser.add_argument("--output", help="file to write the JSON results to")
+    parser.add_argument("--compare", help="baseline JSON results to compare to")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown over the baseline that counts as a regression",
+    )
+    parser.add_argument(
+        "--import-budget",
+        type=float,
+        default=100,
+        help="milliseconds game may take to import in a new interpreter, "
+        "or 0 to skip the check",
+    )
+    parser.add_argument("--list", action="store_true")
+    args = parser.parse_args(argv)
+
+    names = [
+        name for name in BENCHMARKS
+        if not args.names or any(name.startswith(prefix) for prefix in args.names)
+    ]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    results = run(names, args.repeat, args.seconds)
+
+    regressions: typing.List[str] = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+    for name, result in results["benchmarks"].items():
+        ratio = result.get("baseline_ratio")
+        print(
+            f"{name:40} {result['best'] * 1e6:12.1f} us"
+            + (f" {ratio:6.2f}x" if ratio else ""),
+            file=sys.stderr,
+        )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.import_budget:
+        seconds = import_time("game")
+        print(f"{'import/game':40} {seconds * 1e6:12.1f} us", file=sys.stderr)
+        if seconds * 1e3 > args.import_budget:
+            regressions.append("import/game")
+
+    for name in regressions:
+        print(f"regression: {name}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import random
+import typing
+
+import transposition
+from game import Action, Board, Domino, Game, Phase, Play
+
+
+class Policy:
+    """Chooses an action for the current player of a Game."""
+
+    def act(self, game: Game, rng: random.Random) -> Action:
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}()"
+
+
+class RandomPolicy(Policy):
+
+    def act(self, game: Game, rng: random.Random) -> Action:
+        return rng.choice(game.legal_actions())
+
+
+class GreedyPolicy(Policy):
+    """Picks and places whatever scores the most points right now.
+
+    The best points for a domino on a board can be cached in a
+    transposition table.
+    """
+
+    def __init__(self, table: transposition.Table=None):
+        self.table = table
+
+    def act(self, game: Game, rng: random.Random) -> Action:
+        actions = game.legal_actions()
+        board = game.boards[game.current_player()]
+        if game.phase == Phase.SELECT:
+            return max(
+                actions,
+                key=lambda index: best_points(
+                    board,
+                    game.line.line[index][1],
+                    self.table,
+                ),
+            )
+        return max(actions, key=lambda play: points_after(board, play))
+
+
+def points_after(board: Board, play: typing.Union[Play, Domino]) -> int:
+    """Returns the points the board would have after play."""
+    board.apply(play)
+    points = board.points()
+    board.undo()
+    return points
+
+
+def best_points(
+    board: Board,
+    domino: Domino,
+    table: transposition.Table=None,
+) -> int:
+    """Returns the most points the board could have after playing domino."""
+    if table is not None:
+        key = (board.key(canonical=True), domino.number)
+        points = table.get(key)
+        if points is not None:
+            return points
+
+    points = max(
+        (
+            points_after(board, play)
+            for play in board.valid_plays(domino)
+        ),
+        default=points_after(board, domino),
+    )
+
+    if table is not None:
+        table.put(key, points)
+    return points
+
+
+POLICIES: typing.Dict[str, typing.Type[Policy]] = {
+    "random": RandomPolicy,
+    "greedy": GreedyPolicy,
+}
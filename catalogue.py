@@ -0,0 +1,114 @@
+"""The dominoes of kingdomino.json, loaded once per process.
+
+Tiles are encoded as small ints, suit index * 4 + crowns. The parsed
+catalogue is cached next to the JSON as packed bytes, stamped with the
+JSON's mtime, so later processes skip parsing it. The cache is written
+to a temporary file and moved into place, so processes loading at once
+never see half of one, and a directory that cannot be written to just
+goes without.
+"""
+import array
+import os
+import struct
+import tempfile
+import typing
+
+from game import Domino, Dominoes, Suit, Tile
+
+FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kingdomino.json")
+
+MAGIC = b"KDOM"
+VERSION = 1
+HEADER = struct.Struct("<4sBqH")
+
+SUITS: typing.Tuple[Suit, ...] = tuple(Suit)
+MAX_CROWNS = 3
+
+TILES: typing.Tuple[Tile, ...] = tuple(
+    Tile(suit, crowns)
+    for suit in SUITS
+    for crowns in range(MAX_CROWNS + 1)
+)
+
+
+def encode_tile(tile: Tile) -> int:
+    return SUITS.index(tile.suit) * (MAX_CROWNS + 1) + tile.crowns
+
+
+def decode_tile(code: int) -> Tile:
+    return TILES[code]
+
+
+def cache_filename(filename: str) -> str:
+    return os.path.splitext(filename)[0] + ".bin"
+
+
+def dump(dominoes: typing.Iterable[Domino], mtime: int) -> bytes:
+    codes = array.array("B")
+    for domino in dominoes:
+        codes.extend(
+            (domino.number, encode_tile(domino.left), encode_tile(domino.right))
+        )
+    return HEADER.pack(MAGIC, VERSION, mtime, len(codes) // 3) + codes.tobytes()
+
+
+def parse(data: bytes, mtime: int) -> typing.Optional[Dominoes]:
+    """Returns the cached dominoes, or None if the cache is stale."""
+    if len(data) < HEADER.size:
+        return None
+    magic, version, cached_mtime, count = HEADER.unpack_from(data)
+    if (magic, version, cached_mtime) != (MAGIC, VERSION, mtime):
+        return None
+    codes = array.array("B", data[HEADER.size:])
+    if len(codes) != count * 3:
+        return None
+    return Dominoes(
+        Domino(number=number, left=TILES[left], right=TILES[right])
+        for number, left, right in zip(codes[::3], codes[1::3], codes[2::3])
+    )
+
+
+def load(filename: str=FILENAME) -> Dominoes:
+    """Returns the dominoes of filename, using and refreshing its cache."""
+    mtime = os.stat(filename).st_mtime_ns
+    cache = cache_filename(filename)
+    try:
+        with open(cache, "rb") as f:
+            dominoes = parse(f.read(), mtime)
+    except OSError:
+        dominoes = None
+
+    if dominoes is None:
+        dominoes = Dominoes.from_json(filename)
+        _write(cache, dump(dominoes, mtime))
+    return dominoes
+
+
+def _write(filename: str, data: bytes) -> None:
+    try:
+        fd, temporary = tempfile.mkstemp(
+            dir=os.path.dirname(filename),
+            suffix=".tmp",
+        )
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # mkstemp makes the file readable only by its owner.
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, filename)
+    except OSError:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+
+
+CATALOGUE: typing.Tuple[Domino, ...] = tuple(
+    sorted(load(), key=lambda domino: domino.number)
+)
+
+
+def by_number(number: int) -> Domino:
+    return CATALOGUE[number - 1]
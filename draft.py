@@ -0,0 +1,164 @@
+import random
+import time
+import typing
+
+import bots
+import transposition
+from game import Action, Board, Domino, Game, Phase, Play
+
+
+class Recommendation(typing.NamedTuple):
+    index: int
+    domino: Domino
+    value: float
+    immediate: int
+    samples: int
+
+
+class DraftEvaluator:
+    """Ranks the dominoes left in the line by the points expected after
+    this turn and the next.
+
+    Each pick is played in its best place, then the next line is sampled
+    from the dominoes not drawn yet. Picking index i of this line means
+    picking i-th next turn, so i dominoes of the sampled line are taken
+    at random first, and the best of the rest is played. Best placements
+    are cached per board and domino.
+    """
+
+    def __init__(
+        self,
+        samples: int=32,
+        seconds: float=0.05,
+        table: transposition.Table=None,
+        rng: random.Random=None,
+    ):
+        if table is None:
+            table = transposition.LRUTable(1 << 16)
+        if rng is None:
+            rng = random.Random()
+        self.samples = samples
+        self.seconds = seconds
+        self.table = table
+        self.rng = rng
+
+    def best(
+        self,
+        board: Board,
+        domino: Domino,
+    ) -> typing.Tuple[int, typing.Union[Play, Domino]]:
+        """Returns the most points the board can have after domino, and the
+        play that gets them."""
+        key = (board.key(), domino.number)
+        best = self.table.get(key)
+        if best is None:
+            best = max(
+                (
+                    (bots.points_after(board, play), play)
+                    for play in board.valid_plays(domino)
+                ),
+                key=lambda option: option[0],
+                default=(bots.points_after(board, domino), domino),
+            )
+            self.table.put(key, best)
+        return best
+
+    def rank(self, game: Game) -> typing.List[Recommendation]:
+        """Returns the open dominoes of the line, best first, within the
+        time budget.
+
+        Each evaluation only starts if the slowest one so far would still
+        finish in time, though the first option is always scored. Options
+        the budget did not reach are valued at the board's current points,
+        and samples it cut short are dropped so every option has the same
+        number.
+        """
+        clock = time.perf_counter
+        # A tenth of the budget is kept for sampling lines and sorting.
+        deadline = clock() + self.seconds * 0.9
+        slowest = 0.0
+
+        def best(
+            board: Board,
+            domino: Domino,
+            force: bool=False,
+        ) -> typing.Optional[typing.Tuple[int, typing.Union[Play, Domino]]]:
+            nonlocal slowest
+            start = clock()
+            if not force and start + slowest > deadline:
+                return None
+            result = self.best(board, domino)
+            slowest = max(slowest, clock() - start)
+            return result
+
+        board = game.boards[game.current_player()]
+        options = game.legal_actions()
+
+        plays = {}
+        immediate = {}
+        for index in options:
+            result = best(board, game.line.line[index][1], force=not plays)
+            if result is None:
+                immediate[index] = board.points()
+            else:
+                immediate[index], plays[index] = result
+
+        future: typing.Dict[int, typing.List[int]] = {index: [] for index in options}
+        unseen = game.unseen()
+        draw_num = game.deck.draw_num
+        if not game.deck.empty() and len(unseen) >= draw_num:
+            boards = {}
+            for index, play in plays.items():
+                boards[index] = board.copy()
+                boards[index].apply(play)
+            for _ in range(self.samples):
+                line = self.rng.sample(unseen, draw_num)
+                sample = {}
+                for index in plays:
+                    available = self.rng.sample(line, max(draw_num - index, 1))
+                    results = [best(boards[index], domino) for domino in available]
+                    if None in results:
+                        break
+                    sample[index] = max(result[0] for result in results)
+                if len(sample) < len(plays):
+                    break
+                for index, points in sample.items():
+                    future[index].append(points)
+
+        return sorted(
+            (
+                Recommendation(
+                    index=index,
+                    domino=game.line.line[index][1],
+                    value=(
+                        sum(future[index]) / len(future[index])
+                        if future[index] else immediate[index]
+                    ),
+                    immediate=immediate[index],
+                    samples=len(future[index]),
+                )
+                for index in options
+            ),
+            key=lambda recommendation: (recommendation.value, recommendation.immediate),
+            reverse=True,
+        )
+
+
+class DraftPolicy(bots.Policy):
+    """Drafts with a DraftEvaluator and places greedily."""
+
+    def __init__(self, samples: int=32, seconds: float=0.05):
+        self.evaluator = DraftEvaluator(samples, seconds)
+
+    def act(self, game: Game, rng: random.Random) -> Action:
+        self.evaluator.rng = rng
+        if game.phase == Phase.SELECT:
+            return self.evaluator.rank(game)[0].index
+        board = game.boards[game.current_player()]
+        return self.evaluator.best(board, game.current_domino())[1]
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}("
+            f"samples={self.evaluator.samples}, seconds={self.evaluator.seconds})"
+        )
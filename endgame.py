@@ -0,0 +1,165 @@
+"""Solves the last turn exactly.
+
+Once the deck is empty the line holds every domino left to play, so the
+game has no more chance in it. Each player's final board depends only on
+the dominoes they pick, so the draft is searched with every finished pick
+valued by the best placements of each player's dominoes, which are
+searched exhaustively and cached by board hash. Two player games are
+zero sum on the margin and are searched with alpha-beta, otherwise each
+picker maximises their lead over the best other player.
+"""
+import random
+import typing
+
+import bots
+import transposition
+from game import Action, Board, Domino, Game, Phase, Player
+
+Line = typing.Tuple[typing.Tuple[typing.Optional[Player], Domino], ...]
+Points = typing.Dict[Player, int]
+
+
+class Solution(typing.NamedTuple):
+    action: Action
+    points: Points
+
+
+class EndgameSolver:
+    """Finds optimal last turn actions for every player."""
+
+    def __init__(self, table: transposition.Table=None):
+        if table is None:
+            table = transposition.LRUTable(1 << 16)
+        self.table = table
+
+    @staticmethod
+    def solvable(game: Game) -> bool:
+        return game.deck.empty() and not game.over()
+
+    def place(
+        self,
+        board: Board,
+        dominoes: typing.Tuple[Domino, ...],
+    ) -> typing.Tuple[int, typing.Tuple[Action, ...]]:
+        """Returns the most points the board can end with after placing
+        dominoes in order, and the actions that get them."""
+        if not dominoes:
+            return board.points(), ()
+        key = (board.key(), tuple(domino.number for domino in dominoes))
+        best = self.table.get(key)
+        if best is not None:
+            return best
+
+        domino, rest = dominoes[0], dominoes[1:]
+        actions: typing.List[Action] = list(board.valid_plays(domino)) or [domino]
+        for action in actions:
+            board.apply(action)
+            points, after = self.place(board, rest)
+            board.undo()
+            if best is None or points > best[0]:
+                best = (points, (action,) + after)
+        self.table.put(key, best, depth=len(dominoes))
+        return best
+
+    def final_points(self, game: Game, line: Line) -> Points:
+        """Returns each player's best final points once line is picked."""
+        return {
+            player: self.place(
+                game.boards[player],
+                tuple(domino for owner, domino in line if owner == player),
+            )[0]
+            for player in game.players
+        }
+
+    def _search(
+        self,
+        game: Game,
+        line: Line,
+        order: typing.Tuple[Player, ...],
+        alpha: float,
+        beta: float,
+    ) -> typing.Tuple[Points, typing.Optional[int]]:
+        if not order:
+            return self.final_points(game, line), None
+
+        picker = order[0]
+        board = game.boards[picker]
+        options = sorted(
+            (i for i, (owner, _) in enumerate(line) if owner is None),
+            key=lambda i: self.place(board, (line[i][1],))[0],
+            reverse=True,
+        )
+        zero_sum = len(game.players) == 2
+        first = game.players[0]
+
+        best_points: typing.Optional[Points] = None
+        best_index = None
+        best_value = None
+        for index in options:
+            picked = line[:index] + ((picker, line[index][1]),) + line[index + 1:]
+            points, _ = self._search(game, picked, order[1:], alpha, beta)
+            value = _utility(points, picker)
+            if best_value is None or value > best_value:
+                best_points, best_index, best_value = points, index, value
+            if zero_sum:
+                margin = _utility(points, first)
+                if picker == first:
+                    alpha = max(alpha, margin)
+                else:
+                    beta = min(beta, margin)
+                if alpha >= beta:
+                    break
+        return best_points, best_index
+
+    def solve(self, game: Game) -> Solution:
+        """Returns the optimal action for the current player and the final
+        points every player ends with from there."""
+        if not self.solvable(game):
+            raise ValueError("the deck is not empty")
+        line: Line = tuple(game.line.line)
+
+        if game.phase == Phase.SELECT:
+            points, index = self._search(
+                game,
+                line,
+                tuple(game.order),
+                float("-inf"),
+                float("inf"),
+            )
+            return Solution(index, points)
+
+        player = game.current_player()
+        _, actions = self.place(
+            game.boards[player],
+            tuple(domino for owner, domino in line if owner == player),
+        )
+        return Solution(actions[0], self.final_points(game, line))
+
+
+def _utility(points: Points, player: Player) -> int:
+    """Returns the lead of player over the best other player."""
+    return points[player] - max(
+        (
+            other_points for other, other_points in points.items()
+            if other != player
+        ),
+        default=0,
+    )
+
+
+class EndgamePolicy(bots.Policy):
+    """Plays another policy until the last turn, then plays it perfectly."""
+
+    def __init__(self, policy: bots.Policy=None):
+        if policy is None:
+            policy = bots.GreedyPolicy()
+        self.policy = policy
+        self.solver = EndgameSolver()
+
+    def act(self, game: Game, rng: random.Random) -> Action:
+        if self.solver.solvable(game):
+            return self.solver.solve(game).action
+        return self.policy.act(game, rng)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.policy!r})"
@@ -0,0 +1,289 @@
+"""A reinforcement learning environment in the style of Gymnasium.
+
+Actions are a single fixed-size discrete space: first an index into the
+line, then every (x, y, direction) placement, then discarding. The legal
+action mask is built straight from the bitboard move generator. The
+action and observation spaces need gymnasium to be installed.
+"""
+import random
+import typing
+
+import numpy as np
+
+import bots
+import catalogue
+from game import (
+    Action,
+    BitGrid,
+    Direction,
+    DrawNum,
+    Game,
+    GridSize,
+    InvalidPlay,
+    Phase,
+    Play,
+    Player,
+    Point,
+    Rule,
+    Suit,
+    TermColor,
+)
+
+LINE_SIZE = int(max(DrawNum))
+DIRECTIONS: typing.Tuple[Direction, ...] = tuple(Direction)
+PLANES: typing.Tuple[Suit, ...] = tuple(suit for suit in Suit if suit != Suit.NONE)
+# Number, then suit and crowns of each half, then seat that picked it.
+LINE_FEATURES = 6
+
+Observation = typing.Dict[str, np.ndarray]
+
+
+def bits(mask: int, grid: BitGrid) -> np.ndarray:
+    """Returns a bitboard mask as a (max_size, max_size) bool array."""
+    size = grid.max_size * grid.stride
+    unpacked = np.unpackbits(
+        np.frombuffer(mask.to_bytes((size + 7) // 8, "little"), dtype=np.uint8),
+        count=size,
+        bitorder="little",
+    )
+    return unpacked.reshape(grid.max_size, grid.stride)[:, :grid.max_size].astype(bool)
+
+
+def planes(grid: BitGrid) -> np.ndarray:
+    """Returns a plane per suit, castle included, then a crowns plane."""
+    low, high = grid.crowns
+    return np.stack(
+        [bits(grid.suits[suit], grid) for suit in PLANES]
+        + [bits(low, grid) + 2 * bits(high, grid)]
+    ).astype(np.uint8)
+
+
+class KingdominoEnv:
+    """A game where the agent plays seat 1, and any seat without an
+    opponent policy.
+
+    Rewards are the change in the acting seat's points, so they add up to
+    the final score.
+    """
+
+    def __init__(
+        self,
+        players: int=2,
+        rules: Rule=None,
+        opponents: typing.Sequence[bots.Policy]=(),
+    ):
+        self.players = [
+            Player(name=f"Player {i + 1}", color=color)
+            for i, color in zip(range(players), TermColor)
+        ]
+        self.rules = rules
+        self.opponents = dict(zip(self.players[1:], opponents))
+        self.max_size = (
+            GridSize.MIGHTY_DUEL if rules and Rule.MIGHTY_DUEL in rules
+            else GridSize.STANDARD
+        ) * 2 - 1
+        self.placements = self.max_size * self.max_size * len(DIRECTIONS)
+        self.actions = LINE_SIZE + self.placements + 1
+        self.discard = self.actions - 1
+        self.game: typing.Optional[Game] = None
+        self.rng = random.Random()
+
+    @property
+    def action_space(self) -> typing.Any:
+        from gymnasium import spaces  # type: ignore
+
+        return spaces.Discrete(self.actions)
+
+    @property
+    def observation_space(self) -> typing.Any:
+        from gymnasium import spaces  # type: ignore
+
+        return spaces.Dict({
+            "boards": spaces.Box(
+                low=0,
+                high=3,
+                shape=(len(self.players), len(PLANES) + 1, self.max_size, self.max_size),
+                dtype=np.uint8,
+            ),
+            "line": spaces.Box(
+                low=-1,
+                high=np.iinfo(np.int8).max,
+                shape=(LINE_SIZE, LINE_FEATURES),
+                dtype=np.int8,
+            ),
+            "deck": spaces.MultiBinary(len(catalogue.CATALOGUE)),
+            "phase": spaces.Box(
+                low=min(phase.value for phase in Phase),
+                high=max(phase.value for phase in Phase),
+                shape=(),
+                dtype=np.int8,
+            ),
+        })
+
+    def reset(
+        self,
+        seed: int=None,
+    ) -> typing.Tuple[Observation, typing.Dict[str, typing.Any]]:
+        self.rng = random.Random(seed)
+        self.game = Game(
+            dominoes=catalogue.CATALOGUE,
+            players=self.players,
+            rules=self.rules,
+            rng=self.rng,
+        )
+        self._play_opponents()
+        return self.observation(), {"action_mask": self.action_mask()}
+
+    def step(
+        self,
+        action: int,
+    ) -> typing.Tuple[Observation, float, bool, bool, typing.Dict[str, typing.Any]]:
+        game = self.game
+        if game is None or game.over():
+            raise ValueError("the game is over, call reset")
+        # Agents often sample numpy ints, which overflow the bitboards.
+        action = int(action)
+        player = game.current_player()
+        board = game.boards[player]
+        points = board.points()
+
+        game.step(self.decode(action))
+        self._play_opponents()
+
+        reward = float(board.points() - points)
+        info = {
+            "player": self.players.index(player),
+            "action_mask": self.action_mask(),
+        }
+        return self.observation(), reward, game.over(), False, info
+
+    def _play_opponents(self) -> None:
+        game = self.game
+        while not game.over() and game.current_player() in self.opponents:
+            game.step(self.opponents[game.current_player()].act(game, self.rng))
+
+    def decode(self, action: int) -> Action:
+        game = self.game
+        if game.phase == Phase.SELECT and action < LINE_SIZE:
+            return action
+        domino = game.current_domino()
+        if game.phase != Phase.PLACE or action < LINE_SIZE:
+            raise InvalidPlay
+        if action == self.discard:
+            return domino
+        cell, direction = divmod(action - LINE_SIZE, len(DIRECTIONS))
+        x, y = divmod(cell, self.max_size)
+        return Play(domino=domino, point=Point(x, y), direction=DIRECTIONS[direction])
+
+    def action_mask(self) -> np.ndarray:
+        mask = np.zeros(self.actions, dtype=bool)
+        game = self.game
+        if game.phase == Phase.SELECT:
+            for i, (player, _) in enumerate(game.line.line):
+                mask[i] = player is None
+        elif game.phase == Phase.PLACE:
+            grid = game.boards[game.current_player()].grid
+            domino = game.current_domino()
+            placements = grid.placements(domino.left, domino.right)
+            view = mask[LINE_SIZE:LINE_SIZE + self.placements].reshape(
+                self.max_size, self.max_size, len(DIRECTIONS)
+            )
+            for i, direction in enumerate(DIRECTIONS):
+                view[:, :, i] = bits(placements[direction], grid)
+            mask[self.discard] = not view.any()
+        return mask
+
+    def observation(self) -> Observation:
+        """Returns every board from the acting seat's point of view, the
+        line and which dominoes have not been drawn yet."""
+        game = self.game
+        seat = game.players.index(game.current_player() or game.players[0])
+        seats = game.players[seat:] + game.players[:seat]
+
+        line = np.zeros((LINE_SIZE, LINE_FEATURES), dtype=np.int8)
+        for i, (player, domino) in enumerate(game.line.line):
+            line[i] = (
+                domino.number,
+                domino.left.suit.value,
+                domino.left.crowns,
+                domino.right.suit.value,
+                domino.right.crowns,
+                -1 if player is None else seats.index(player),
+            )
+
+        drawn = {domino.number for domino in game.deck.drawn}
+        return {
+            "boards": np.stack([planes(game.boards[player].grid) for player in seats]),
+            "line": line,
+            "deck": np.array(
+                [domino.number not in drawn for domino in catalogue.CATALOGUE],
+                dtype=np.uint8,
+            ),
+            "phase": np.array(game.phase.value, dtype=np.int8),
+        }
+
+
+class VecEnv:
+    """Steps many environments in lockstep, resetting each when it ends."""
+
+    def __init__(
+        self,
+        count: int,
+        players: int=2,
+        rules: Rule=None,
+        opponents: typing.Sequence[bots.Policy]=(),
+    ):
+        self.envs = [
+            KingdominoEnv(players, rules, opponents)
+            for _ in range(count)
+        ]
+        self.seed = 0
+
+    def reset(
+        self,
+        seed: int=0,
+    ) -> typing.Tuple[Observation, typing.Dict[str, np.ndarray]]:
+        self.seed = seed + len(self.envs)
+        observations, infos = zip(*(
+            env.reset(seed + i) for i, env in enumerate(self.envs)
+        ))
+        return self._stack(observations), self._stack(infos)
+
+    def step(
+        self,
+        actions: typing.Sequence[int],
+    ) -> typing.Tuple[
+        Observation,
+        np.ndarray,
+        np.ndarray,
+        np.ndarray,
+        typing.Dict[str, np.ndarray],
+    ]:
+        observations = []
+        rewards = np.zeros(len(self.envs), dtype=np.float32)
+        terminated = np.zeros(len(self.envs), dtype=bool)
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            observation, rewards[i], terminated[i], _, info = env.step(int(action))
+            if terminated[i]:
+                observation, reset_info = env.reset(self.seed)
+                info = dict(info, action_mask=reset_info["action_mask"])
+                self.seed += 1
+            observations.append(observation)
+            infos.append(info)
+        return (
+            self._stack(observations),
+            rewards,
+            terminated,
+            np.zeros(len(self.envs), dtype=bool),
+            self._stack(infos),
+        )
+
+    @staticmethod
+    def _stack(
+        dicts: typing.Sequence[typing.Dict[str, typing.Any]],
+    ) -> typing.Dict[str, np.ndarray]:
+        return {
+            key: np.stack([np.asarray(d[key]) for d in dicts])
+            for key in dicts[0]
+        }
@@ -1,8 +1,7 @@
 import collections
-import colored # type: ignore
-import csv
+import copy
 import enum
-import json
+import functools
 import random
 import sys
 import typing
@@ -46,7 +45,6 @@ class TermColor(enum.Enum):
 class MaxTurns(enum.IntEnum):
     TWO_PLAYERS = 6
     STANDARD    = 12
-    MIGHTY_DUEL = 24
 
 
 class DrawNum(enum.IntEnum):
@@ -95,36 +93,34 @@ class Suit(enum.Enum):
 
     @classmethod
     def from_string(cls, string: str):
-        return {
-            "forest": cls.FOREST,
-            "grass" : cls.GRASS,
-            "mine"  : cls.MINE,
-            "swamp" : cls.SWAMP,
-            "water" : cls.WATER,
-            "wheat" : cls.WHEAT,
-        }[string]
+        return _SUIT_FROM_STRING[string]
 
     def to_string(self) -> str:
-        return {
-            Suit.FOREST:    "forest",
-            Suit.GRASS:     "grass",
-            Suit.MINE:      "mine",
-            Suit.SWAMP:     "swamp",
-            Suit.WATER:     "water",
-            Suit.WHEAT:     "wheat",
-        }[self]
+        return _SUIT_TO_STRING[self]
 
     def to_color(self) -> TermColor:
-        return {
-            Suit.FOREST:    TermColor.DARK_GREEN,
-            Suit.GRASS:     TermColor.GREEN,
-            Suit.MINE:      TermColor.DARK_GREY,
-            Suit.SWAMP:     TermColor.GREY,
-            Suit.WATER:     TermColor.BLUE,
-            Suit.WHEAT:     TermColor.YELLOW,
-            Suit.CASTLE:    TermColor.WHITE,
-            Suit.NONE:      TermColor.NONE,
-        }[self]
+        return _SUIT_COLOR[self]
+
+
+_SUIT_TO_STRING = {
+    Suit.FOREST:    "forest",
+    Suit.GRASS:     "grass",
+    Suit.MINE:      "mine",
+    Suit.SWAMP:     "swamp",
+    Suit.WATER:     "water",
+    Suit.WHEAT:     "wheat",
+}
+_SUIT_FROM_STRING = {string: suit for suit, string in _SUIT_TO_STRING.items()}
+_SUIT_COLOR = {
+    Suit.FOREST:    TermColor.DARK_GREEN,
+    Suit.GRASS:     TermColor.GREEN,
+    Suit.MINE:      TermColor.DARK_GREY,
+    Suit.SWAMP:     TermColor.GREY,
+    Suit.WATER:     TermColor.BLUE,
+    Suit.WHEAT:     TermColor.YELLOW,
+    Suit.CASTLE:    TermColor.WHITE,
+    Suit.NONE:      TermColor.NONE,
+}
 
 
 class Direction(Point, enum.Enum):
@@ -135,26 +131,29 @@ class Direction(Point, enum.Enum):
 
     @classmethod
     def from_string(cls, string: str):
-        return {
-            "east":     cls.EAST,
-            "e":        cls.EAST,
-            "south":    cls.SOUTH,
-            "s":        cls.SOUTH,
-            "west":     cls.WEST,
-            "w":        cls.WEST,
-            "north":    cls.NORTH,
-            "n":        cls.NORTH,
-        }[string]
-
+        return _DIRECTION_FROM_STRING[string]
 
     @classmethod
     def opposite(cls, direction):
-        return {
-            cls.EAST:   cls.WEST,
-            cls.SOUTH:  cls.NORTH,
-            cls.WEST:   cls.EAST,
-            cls.NORTH:  cls.SOUTH,
-        }[direction]
+        return _OPPOSITE[direction]
+
+
+_DIRECTION_FROM_STRING = {
+    "east":     Direction.EAST,
+    "e":        Direction.EAST,
+    "south":    Direction.SOUTH,
+    "s":        Direction.SOUTH,
+    "west":     Direction.WEST,
+    "w":        Direction.WEST,
+    "north":    Direction.NORTH,
+    "n":        Direction.NORTH,
+}
+_OPPOSITE = {
+    Direction.EAST:     Direction.WEST,
+    Direction.SOUTH:    Direction.NORTH,
+    Direction.WEST:     Direction.EAST,
+    Direction.NORTH:    Direction.SOUTH,
+}
 
 
 class Player(typing.NamedTuple):
@@ -176,17 +175,8 @@ class Tile(typing.NamedTuple):
 
 
     def __str__(self) -> str:
-        if self.suit == Suit.CASTLE:
-            char = "C"
-        elif self.crowns == 0:
-            char = " "
-        else:
-            char = self.crowns
-
-        return colored.stylize(
-            char,
-            colored.fg("white") + colored.bg(self.suit.to_color().value)
-        )
+        from render import RENDERER
+        return RENDERER.tile(self)
 
 
 class Domino(typing.NamedTuple):
@@ -199,17 +189,51 @@ class Domino(typing.NamedTuple):
 
 
 class Play:
-
-    def __init__(
-        self,
+    """A domino with its left half on point and its right half one step
+    towards direction.
+
+    Plays are immutable and interned, and are identified by code, a small
+    int packing the domino number, point and direction. The two ways of
+    placing a domino with matching halves are the same play, kept with
+    its direction EAST or SOUTH. Coordinates are packed as signed bytes,
+    so a ValueError is raised for any outside -128 to 127.
+    """
+    __slots__ = ("domino", "point", "direction", "points", "code")
+
+    def __new__(
+        cls,
         domino: Domino,
         point: Point,
         direction: Direction,
     ):
-        self.domino = domino
-        self.point = point
-        self.direction = direction
-        self.points = (self.point, self.point + self.direction)
+        if domino.left == domino.right and direction in (
+            Direction.WEST,
+            Direction.NORTH,
+        ):
+            point, direction = point + direction, _OPPOSITE[direction]
+        if not (-128 <= point.x < 128 and -128 <= point.y < 128):
+            raise ValueError(f"{point} is too far off any grid")
+        code = (
+            (domino.number << 16 | (point.x & 0xFF) << 8 | point.y & 0xFF) << 2
+            | DIRECTION_INDEX[direction]
+        )
+        play = _PLAYS.get(code)
+        if play is None or play.domino != domino:
+            play = super().__new__(cls)
+            set_attribute = super(Play, play).__setattr__
+            set_attribute("domino", domino)
+            set_attribute("point", point)
+            set_attribute("direction", direction)
+            set_attribute("points", (point, point + direction))
+            set_attribute("code", code)
+            _PLAYS[code] = play
+        return play
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("Play is immutable")
+
+    def __reduce__(self):
+        return (self.__class__, (self.domino, self.point, self.direction))
 
     def left_adjacent_points(self) -> typing.List[Point]:
         return [
@@ -237,24 +261,11 @@ class Play:
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, Play):
-            raise NotImplementedError
-        return (
-            self.domino == other.domino
-            and (
-                (
-                    self.point == other.point
-                    and self.direction == other.direction
-                )
-                or
-                (
-                    self.point == other.point + other.direction
-                    and self.direction == Direction.opposite(other.direction)
-                )
-            )
-        )
+            return NotImplemented
+        return self.code == other.code
 
     def __hash__(self):
-        return hash((self.domino, self.point, self.direction))
+        return self.code
 
     @classmethod
     def flipped(cls, play):
@@ -267,6 +278,129 @@ class Play:
     def __repr__(self):
         return f"{self.point.x} {self.point.y} {self.direction.name}"
 
+
+_PLAYS: typing.Dict[int, Play] = {}
+
+_zobrist = random.Random("zobrist")
+ZOBRIST: typing.Dict[Tile, typing.List[int]] = {
+    Tile(suit, crowns): [
+        _zobrist.getrandbits(64)
+        for _ in range((GridSize.MIGHTY_DUEL * 2 - 1) ** 2)
+    ]
+    for suit in Suit
+    for crowns in range(4)
+}
+
+
+@functools.lru_cache(maxsize=None)
+def symmetries(max_size: int) -> typing.Tuple[typing.Tuple[int, ...], ...]:
+    """Returns, for each of the 8 rotations and reflections about the
+    middle of the grid, the index each cell index is mapped to."""
+    half = max_size // 2
+    return tuple(
+        tuple(
+            (half + a * (x - half) + b * (y - half)) * max_size
+            + half + c * (x - half) + d * (y - half)
+            for x in range(max_size)
+            for y in range(max_size)
+        )
+        for a, b, c, d in (
+            ( 1,  0,  0,  1),
+            ( 0, -1,  1,  0),
+            (-1,  0,  0, -1),
+            ( 0,  1, -1,  0),
+            ( 1,  0,  0, -1),
+            (-1,  0,  0,  1),
+            ( 0,  1,  1,  0),
+            ( 0, -1, -1,  0),
+        )
+    )
+
+
+DIRECTION_INDEX: typing.Dict[Direction, int] = {
+    direction: i for i, direction in enumerate(Direction)
+}
+
+
+class CellTables(typing.NamedTuple):
+    """What never changes about a domino with its left on a cell, indexed
+    by cell index x * max_size + y and then by direction index.
+
+    A partner of -1 means the right half would be off the grid, in which
+    case the other tables are empty.
+    """
+    points: typing.Tuple[Point, ...]
+    bits: typing.Tuple[int, ...]
+    partners: typing.Tuple[typing.Tuple[int, ...], ...]
+    # The neighbours of both halves, for the frontier.
+    around: typing.Tuple[typing.Tuple[typing.Tuple[Point, ...], ...], ...]
+    # (half, neighbour cell) for every edge out of the domino.
+    edges: typing.Tuple[typing.Tuple[typing.Tuple[typing.Tuple[int, int], ...], ...], ...]
+    # BitGrid masks of both halves, and of the neighbours of each half.
+    pairs: typing.Tuple[typing.Tuple[int, ...], ...]
+    left_neighbours: typing.Tuple[typing.Tuple[int, ...], ...]
+    right_neighbours: typing.Tuple[typing.Tuple[int, ...], ...]
+
+
+@functools.lru_cache(maxsize=None)
+def cell_tables(max_size: int) -> CellTables:
+    """Returns the tables for a grid size, built the first time a grid of
+    that size is made."""
+    stride = max_size + 1
+    offsets = [(direction.x, direction.y) for direction in Direction]
+
+    def cell(x: int, y: int) -> int:
+        if 0 <= x < max_size and 0 <= y < max_size:
+            return x * max_size + y
+        return -1
+
+    def neighbours(index: int, exclude: int) -> typing.List[int]:
+        x, y = divmod(index, max_size)
+        return [
+            neighbour
+            for neighbour in (cell(x + dx, y + dy) for dx, dy in offsets)
+            if neighbour >= 0 and neighbour != exclude
+        ]
+
+    points = tuple(
+        Point(x, y) for x in range(max_size) for y in range(max_size)
+    )
+    bits = tuple(1 << (point.x * stride + point.y) for point in points)
+    partners, around, edges, pairs, left_neighbours, right_neighbours = (
+        [], [], [], [], [], []
+    )
+    for index, point in enumerate(points):
+        for dx, dy in offsets:
+            partner = cell(point.x + dx, point.y + dy)
+            if partner < 0:
+                outside: typing.Tuple[typing.List[int], typing.List[int]] = ([], [])
+            else:
+                outside = (neighbours(index, partner), neighbours(partner, index))
+            partners.append(partner)
+            around.append(tuple(points[n] for n in outside[0] + outside[1]))
+            edges.append(tuple(
+                (half, neighbour)
+                for half in (0, 1)
+                for neighbour in outside[half]
+            ))
+            pairs.append(bits[index] | bits[partner] if partner >= 0 else 0)
+            left_neighbours.append(sum(bits[n] for n in outside[0]))
+            right_neighbours.append(sum(bits[n] for n in outside[1]))
+
+    sides = len(offsets)
+    return CellTables(
+        points,
+        bits,
+        *(
+            tuple(
+                tuple(table[i:i + sides])
+                for i in range(0, len(table), sides)
+            )
+            for table in (partners, around, edges, pairs, left_neighbours, right_neighbours)
+        ),
+    )
+
+
 class Grid:
 
     def __init__(self, size: int):
@@ -275,6 +409,8 @@ class Grid:
         half = size - 1
         self.middle = Point(half, half)
 
+        self.tables = cell_tables(self.max_size)
+
         self.grid = [[None] * self.max_size for _ in range(self.max_size)]
         self.grid[half][half] = Tile(Suit.CASTLE)
 
@@ -283,6 +419,25 @@ class Grid:
         self.min_x = half
         self.min_y = half
 
+        self.hashes = [0] * 8
+        self._rehash(self.middle, Tile(Suit.CASTLE))
+
+    def _rehash(self, point: Point, tile: Tile) -> None:
+        """Toggles tile at point in the Zobrist hash of every symmetry."""
+        keys = ZOBRIST[tile]
+        index = point.x * self.max_size + point.y
+        for i, symmetry in enumerate(symmetries(self.max_size)):
+            self.hashes[i] ^= keys[symmetry[index]]
+
+    @property
+    def hash(self) -> int:
+        return self.hashes[0]
+
+    def canonical_hash(self) -> int:
+        """Returns the same hash for grids that are rotations or
+        reflections of each other."""
+        return min(self.hashes)
+
     def __getitem__(self, point: Point) -> typing.Optional[Tile]:
         return self.grid[point.x][point.y]
 
@@ -290,6 +445,26 @@ class Grid:
         self.min_x, self.min_y = self.min(point)
         self.max_x, self.max_y = self.max(point)
         self.grid[point.x][point.y] = tile
+        self._rehash(point, tile)
+
+    def __delitem__(self, point: Point) -> None:
+        """Removes a tile without shrinking the bounds."""
+        self._rehash(point, self[point])
+        self.grid[point.x][point.y] = None
+
+    @property
+    def bounds(self) -> typing.Tuple[int, int, int, int]:
+        return self.min_x, self.min_y, self.max_x, self.max_y
+
+    @bounds.setter
+    def bounds(self, bounds: typing.Tuple[int, int, int, int]) -> None:
+        self.min_x, self.min_y, self.max_x, self.max_y = bounds
+
+    def copy(self) -> "Grid":
+        new = copy.copy(self)
+        new.grid = [row[:] for row in self.grid]
+        new.hashes = list(self.hashes)
+        return new
 
     def min(self, point: Point) -> Point:
         return Point(min(self.min_x, point.x), min(self.min_y, point.y))
@@ -308,37 +483,253 @@ class Grid:
     def within_grid_and_bounds(self, point: Point) -> bool:
         return self.within_grid(point) and self.within_bounds(point)
 
-    def bounded(self) -> bool:
-        """Returns False if there are any tiles placed outside the grid."""
-        return not any(
-            any(
-                (
-                    self.grid[1][i],
-                    self.grid[self.size - 2][i],
-                    self.grid[i][1],
-                    self.grid[i][self.size - 2],
-                )
+    def vacant(self, point: Point) -> bool:
+        return self[point] is None
+
+    def connects(self, point: Point, tile: Tile, exclude: Point) -> bool:
+        """Returns True if tile placed at point connects to a neighbour,
+        ignoring the neighbour at exclude."""
+        return any(
+            tile.valid_connection(self[neighbour])
+            for neighbour in point.adjacent_points()
+            if neighbour != exclude and self.within_grid_and_bounds(neighbour)
+        )
+
+    def fits(self, cell: int, side: int, left: Tile, right: Tile) -> bool:
+        """Returns True if a domino fits with left on cell and right towards
+        the direction with index side."""
+        partner = self.tables.partners[cell][side]
+        if partner < 0:
+            return False
+        left_point = self.tables.points[cell]
+        right_point = self.tables.points[partner]
+        return (
+            self.within_bounds(left_point)
+            and self.within_bounds(right_point)
+            and self.vacant(left_point)
+            and self.vacant(right_point)
+            and (
+                self.connects(left_point, left, right_point)
+                or self.connects(right_point, right, left_point)
             )
-            for i in range(2,  self.max_size - 1)
+        )
+
+    def matches(self, cell: int, suit: Suit) -> bool:
+        point = self.tables.points[cell]
+        tile = self.grid[point.x][point.y]
+        return tile is not None and tile.suit == suit
+
+    def bounded(self) -> bool:
+        """Returns False if there are any tiles placed outside the size x
+        size square centred on the castle."""
+        half = self.size // 2
+        return (
+            self.min_x >= self.middle.x - half
+            and self.min_y >= self.middle.y - half
+            and self.max_x <= self.middle.x + half
+            and self.max_y <= self.middle.y + half
         )
 
     def __str__(self):
-        return "".join(
-            (
-                "\n↓",
-                "".join(map(str, range(self.max_size))),
-                "\n",
-                "\n".join(
-                    str(i)
-                    + "".join(
-                        str(tile) if tile else " "
-                        for tile in row
-                    )
-                    for i, row in enumerate(self.grid)
-                ),
-            )
+        """Returns the tiles and the cells around them."""
+        from render import RENDERER
+        return RENDERER.grid(self, RENDERER.box(self, margin=1))
+
+
+class BitGrid(Grid):
+    """A Grid stored as integer bitmasks.
+
+    Cell (x, y) is bit x * stride + y, where each row has an extra unused
+    guard column so that shifting by one never wraps into the next row.
+    There is one mask for occupancy, one per Suit and two for crowns.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.max_size = size * 2 - 1
+        self.stride = self.max_size + 1
+        self.tables = cell_tables(self.max_size)
+        half = size - 1
+        self.middle = Point(half, half)
+
+        self.cells = 0
+        for x in range(self.max_size):
+            self.cells |= ((1 << self.max_size) - 1) << (x * self.stride)
+
+        self.occupied = 0
+        self.suits = {suit: 0 for suit in Suit}
+        self.crowns = (0, 0)
+
+        self.max_x = half
+        self.max_y = half
+        self.min_x = half
+        self.min_y = half
+        self.window = self.cells
+
+        self.hashes = [0] * 8
+        self[self.middle] = Tile(Suit.CASTLE)
+
+    def bit(self, point: Point) -> int:
+        """Returns the mask for a point, or 0 if it is outside the grid."""
+        if not self.within_grid(point):
+            return 0
+        return 1 << (point.x * self.stride + point.y)
+
+    def shift(self, mask: int, direction: Direction) -> int:
+        """Moves every cell of mask one step towards direction."""
+        offset = direction.x * self.stride + direction.y
+        if offset > 0:
+            return (mask << offset) & self.cells
+        return (mask >> -offset) & self.cells
+
+    def dilate(self, mask: int) -> int:
+        """Returns the cells orthogonally adjacent to mask."""
+        return (
+            mask << 1
+            | mask >> 1
+            | mask << self.stride
+            | mask >> self.stride
+        ) & self.cells
+
+    def __getitem__(self, point: Point) -> typing.Optional[Tile]:
+        bit = self.bit(point)
+        if not self.occupied & bit:
+            return None
+        for suit, mask in self.suits.items():
+            if mask & bit:
+                break
+        low, high = self.crowns
+        return Tile(
+            suit,
+            int(bool(low & bit)) + 2 * int(bool(high & bit)),
         )
 
+    def __setitem__(self, point: Point, tile: Tile) -> None:
+        self.min_x, self.min_y = self.min(point)
+        self.max_x, self.max_y = self.max(point)
+        self.window = self._window()
+
+        bit = self.bit(point)
+        self.occupied |= bit
+        self.suits[tile.suit] |= bit
+        low, high = self.crowns
+        self.crowns = (
+            low | bit * (tile.crowns & 1),
+            high | bit * (tile.crowns >> 1 & 1),
+        )
+        self._rehash(point, tile)
+
+    def __delitem__(self, point: Point) -> None:
+        self._rehash(point, self[point])
+        clear = ~self.bit(point)
+        self.occupied &= clear
+        for suit, mask in self.suits.items():
+            self.suits[suit] = mask & clear
+        low, high = self.crowns
+        self.crowns = (low & clear, high & clear)
+
+    @Grid.bounds.setter  # type: ignore
+    def bounds(self, bounds: typing.Tuple[int, int, int, int]) -> None:
+        self.min_x, self.min_y, self.max_x, self.max_y = bounds
+        self.window = self._window()
+
+    def copy(self) -> "BitGrid":
+        new = copy.copy(self)
+        new.suits = dict(self.suits)
+        new.hashes = list(self.hashes)
+        return new
+
+    def _window(self) -> int:
+        """Returns the cells that keep the kingdom within size x size."""
+        rows = range(
+            max(self.max_x - self.size + 1, 0),
+            min(self.min_x + self.size, self.max_size),
+        )
+        columns = range(
+            max(self.max_y - self.size + 1, 0),
+            min(self.min_y + self.size, self.max_size),
+        )
+        row = sum(1 << y for y in columns)
+        return sum(row << (x * self.stride) for x in rows)
+
+    @property
+    def grid(self) -> typing.List[typing.List[typing.Optional[Tile]]]:
+        return [
+            [self[Point(x, y)] for y in range(self.max_size)]
+            for x in range(self.max_size)
+        ]
+
+    def within_grid_and_bounds(self, point: Point) -> bool:
+        return bool(self.window & self.bit(point))
+
+    def vacant(self, point: Point) -> bool:
+        return not self.occupied & self.bit(point)
+
+    def fits(self, cell: int, side: int, left: Tile, right: Tile) -> bool:
+        tables = self.tables
+        pair = tables.pairs[cell][side]
+        window = self.window
+        if not pair or pair & window != pair or pair & self.occupied:
+            return False
+        castle = self.suits[Suit.CASTLE]
+        return bool(
+            tables.left_neighbours[cell][side] & window & (self.suits[left.suit] | castle)
+            or tables.right_neighbours[cell][side] & window & (self.suits[right.suit] | castle)
+        )
+
+    def matches(self, cell: int, suit: Suit) -> bool:
+        return bool(self.suits[suit] & self.tables.bits[cell])
+
+    def point(self, index: int) -> Point:
+        return Point(*divmod(index, self.stride))
+
+    def points(self, mask: int) -> typing.Iterator[Point]:
+        """Yields the point of every cell in mask."""
+        while mask:
+            low = mask & -mask
+            yield self.point(low.bit_length() - 1)
+            mask ^= low
+
+    def placements(self, left: Tile, right: Tile) -> typing.Dict[Direction, int]:
+        """Returns, per direction, the mask of points where a domino can be
+        played with left on that point and right on its neighbour."""
+        free = self.window & ~self.occupied
+        castle = self.suits[Suit.CASTLE]
+        left_connects = self.dilate(self.suits[left.suit] | castle)
+        right_connects = self.dilate(self.suits[right.suit] | castle)
+        placements = {}
+        for direction in Direction:
+            back = Direction.opposite(direction)
+            placements[direction] = (
+                free
+                & self.shift(free, back)
+                & (left_connects | self.shift(right_connects, back))
+            )
+        return placements
+
+
+DISCARDED = _zobrist.getrandbits(64)
+RULES: typing.Dict[Rule, int] = {rule: _zobrist.getrandbits(64) for rule in Rule}
+
+
+@functools.lru_cache(maxsize=None)
+def rules_hash(rules: Rule) -> int:
+    """Returns the Zobrist hash of a combination of rules."""
+    value = 0
+    for rule, key in RULES.items():
+        if rule in rules:
+            value ^= key
+    return value
+
+
+class Delta(typing.NamedTuple):
+    """What a Board needs to take back one play or discard."""
+    play: typing.Optional[Play]
+    bounds: typing.Tuple[int, int, int, int] = (0, 0, 0, 0)
+    checkpoint: int = 0
+    added: typing.FrozenSet[Point] = frozenset()
+    removed: typing.FrozenSet[Point] = frozenset()
+
 
 class Board:
 
@@ -346,7 +737,8 @@ class Board:
         self,
         rules: Rule,
         discards: typing.List[Domino]=None,
-        union: unionfind.UnionFind=None,
+        union: unionfind.ArrayUnionFind=None,
+        grid: Grid=None,
     ):
         self.rules = rules
 
@@ -354,42 +746,52 @@ class Board:
             discards = []
         self.discards = discards
 
+        if grid is None:
+            grid = BitGrid(
+                GridSize.MIGHTY_DUEL
+                if Rule.MIGHTY_DUEL in self.rules
+                else GridSize.STANDARD
+            )
+        self.grid = grid
+
         if union is None:
-            union = unionfind.UnionFind()
+            union = unionfind.ArrayUnionFind(self.grid.max_size ** 2)
         self.union = union
 
-        self.grid = Grid(
-            GridSize.MIGHTY_DUEL
-            if Rule.MIGHTY_DUEL in self.rules
-            else GridSize.STANDARD
-        )
+        self.frontier = self._search_frontier()
+        self.history: typing.List[Delta] = []
+
+    def copy(self) -> "Board":
+        new = copy.copy(self)
+        new.discards = list(self.discards)
+        new.union = self.union.copy()
+        new.grid = self.grid.copy()
+        new.frontier = set(self.frontier)
+        new.history = list(self.history)
+        return new
+
+    def key(self, canonical: bool=False) -> int:
+        """Returns a Zobrist hash of the tiles, the rules and whether
+        anything has been discarded. Canonical keys are shared by rotated
+        and reflected boards, so only use them for values that do not
+        depend on orientation, like scores."""
+        grid_hash = self.grid.canonical_hash() if canonical else self.grid.hash
+        return grid_hash ^ rules_hash(self.rules) ^ (DISCARDED * bool(self.discards))
 
     # SCORING
 
     def crowns_and_tiles(self) -> typing.List[typing.Tuple[int, int]]:
-        return [
-            (
-                sum(
-                    self.grid[point].crowns
-                    for point in points
-                ),
-                len(points)
-            )
-            for points in self.union.groups()
-        ]
+        return self.union.regions()
 
     def points(self):
         return (
-            sum(
-                crowns * tiles
-                for crowns, tiles in self.crowns_and_tiles()
-            )
+            self.union.score
             + self.middle_kingdom_points()
             + self.harmony_points()
         )
 
     def crowns(self):
-        return sum(crowns for crowns, tiles in self.crowns_and_tiles())
+        return self.union.total_weight
 
     def middle_kingdom_points(self):
         return (
@@ -415,57 +817,99 @@ class Board:
         if not self.valid_play(play):
             raise InvalidPlay
 
+        self.place(play)
+
+    def place(self, play: Play) -> None:
+        """Plays without checking that the play is valid."""
         self.add_to_grid(play)
         self._unionise(play)
 
-    def valid_play(self, play: Play):
-        return all(
-            (
-                self._vacant(play),
-                self._play_within_bounds(play),
-                self._valid_adjacent(play),
-            )
-        )
+    def apply(self, play: typing.Union[Play, Domino]) -> None:
+        """Plays, or discards a Domino, so that it can be taken back with
+        undo."""
+        if isinstance(play, Domino):
+            self.discard(play)
+            self.history.append(Delta(play=None))
+            return
 
-    def _vacant(self, play: Play) -> bool:
-        return all(
-            self.grid[point] is None
-            for point in play.points
-        )
+        if not self.valid_play(play):
+            raise InvalidPlay
 
-    def _play_within_bounds(self, play: Play) -> bool:
-        return all(
-            self.grid.within_grid_and_bounds(point)
-            for point in play.points
+        bounds = self.grid.bounds
+        checkpoint = self.union.checkpoint()
+        added, removed = self.add_to_grid(play)
+        self._unionise(play)
+        self.history.append(
+            Delta(
+                play=play,
+                bounds=bounds,
+                checkpoint=checkpoint,
+                added=added,
+                removed=removed,
+            )
         )
 
-    def _valid_adjacent(self, play: Play) -> bool:
-        return (
-            any(
-                play.domino.left.valid_connection(self.grid[point])
-                for point in play.left_adjacent_points()
-                if self.grid.within_grid_and_bounds(point)
-            )
-            or any(
-                play.domino.right.valid_connection(self.grid[point])
-                for point in play.right_adjacent_points()
-                if self.grid.within_grid_and_bounds(point)
-            )
+    def undo(self) -> None:
+        """Takes back the last apply."""
+        delta = self.history.pop()
+        if delta.play is None:
+            self.discards.pop()
+            return
+
+        self.union.rollback(delta.checkpoint)
+        for point in delta.play.points:
+            self.union.remove(self._index(point))
+            del self.grid[point]
+        self.grid.bounds = delta.bounds
+        self.frontier -= delta.added
+        self.frontier |= delta.removed
+
+    def valid_play(self, play: Play):
+        return self.grid.within_grid(play.point) and self.grid.fits(
+            self._index(play.point),
+            DIRECTION_INDEX[play.direction],
+            play.domino.left,
+            play.domino.right,
         )
 
-    def add_to_grid(self, play: Play) -> None:
+    def add_to_grid(
+        self,
+        play: Play,
+    ) -> typing.Tuple[typing.FrozenSet[Point], typing.FrozenSet[Point]]:
+        """Returns the points added to and removed from the frontier."""
         left, right = play.points
         self.grid[left] = play.domino.left
         self.grid[right] = play.domino.right
 
+        removed = self.frontier.intersection(play.points)
+        self.frontier -= removed
+        around = self.grid.tables.around[self._index(left)][
+            DIRECTION_INDEX[play.direction]
+        ]
+        added = {
+            neighbour
+            for neighbour in around
+            if self.grid.vacant(neighbour)
+            and neighbour not in self.frontier
+        }
+        self.frontier |= added
+        return frozenset(added), frozenset(removed)
+
+    def _index(self, point: Point) -> int:
+        return point.x * self.grid.max_size + point.y
+
     def _unionise(self, play: Play) -> None:
-        for a, b in play.adjacent_edges():
-            domino_tile = self.grid[a]
-            grid_tile = self.grid[b]
-            if grid_tile is None:
-                continue
-            if domino_tile.suit == grid_tile.suit:
-                self.union.join(a, b)
+        cell = self._index(play.point)
+        side = DIRECTION_INDEX[play.direction]
+        halves = (cell, self.grid.tables.partners[cell][side])
+        tiles = (play.domino.left, play.domino.right)
+        self.union.add(halves[0], tiles[0].crowns)
+        self.union.add(halves[1], tiles[1].crowns)
+        if tiles[0].suit == tiles[1].suit:
+            self.union.join(*halves)
+        for half, neighbour in self.grid.tables.edges[cell][side]:
+            if self.grid.matches(neighbour, tiles[half].suit):
+                self.union.join(halves[half], neighbour)
 
     # VALIDATION
 
@@ -476,6 +920,53 @@ class Board:
             direction: typing.Optional[Direction]=None
     ) -> typing.Set[Play]:
         """Returns a list of all valid plays given a Play containing a domino."""
+        if not isinstance(self.grid, BitGrid):
+            return self._valid_plays_by_point(domino, point, direction)
+
+        grid = self.grid
+        placements = grid.placements(domino.left, domino.right)
+        if point is None:
+            starts = grid.dilate(grid.occupied) & grid.window & ~grid.occupied
+        else:
+            starts = grid.bit(point)
+
+        valid = set()
+        for direction in (direction,) if direction else Direction:
+            opposite = Direction.opposite(direction)
+            for play_direction, mask in (
+                (direction, starts),
+                (opposite, grid.shift(starts, direction)),
+            ):
+                valid.update(
+                    Play(domino=domino, point=start, direction=play_direction)
+                    for start in grid.points(placements[play_direction] & mask)
+                )
+        return valid
+
+    def valid_placements(
+        self,
+        domino: Domino,
+    ) -> typing.List[typing.Tuple[int, int, Direction]]:
+        """Returns every valid play of a domino as (x, y, direction)."""
+        placements = self.grid.placements(domino.left, domino.right)
+        # Both ways round are the same play when the halves match.
+        directions = (
+            (Direction.EAST, Direction.SOUTH)
+            if domino.left == domino.right
+            else Direction
+        )
+        return [
+            (point.x, point.y, direction)
+            for direction in directions
+            for point in self.grid.points(placements[direction])
+        ]
+
+    def _valid_plays_by_point(
+            self,
+            domino: Domino,
+            point: typing.Optional[Point]=None,
+            direction: typing.Optional[Direction]=None
+    ) -> typing.Set[Play]:
         valid = set()
         directions = (direction,) if direction else Direction
         points = (point,) if point else self._vacant_points()
@@ -494,8 +985,18 @@ class Board:
 
         return valid
 
-    def _vacant_points(self) -> typing.List[Point]:
-        vacant_points = []
+    def _vacant_points(self, bounded: bool=True) -> typing.List[Point]:
+        """Returns the vacant points next to the kingdom, optionally only
+        those that keep it within bounds."""
+        if not bounded:
+            return list(self.frontier)
+        return [
+            point for point in self.frontier
+            if self.grid.within_grid_and_bounds(point)
+        ]
+
+    def _search_frontier(self) -> typing.Set[Point]:
+        vacant_points = set()
         seen: set = set()
         frontier = collections.deque((self.grid.middle, ))
         while frontier:
@@ -507,10 +1008,10 @@ class Board:
                 seen.add(point)
 
             for new_point in point.adjacent_points():
-                if not self.grid.within_grid_and_bounds(new_point):
+                if not self.grid.within_grid(new_point):
                     continue
-                if self.grid[new_point] is None:
-                    vacant_points.append(new_point)
+                if self.grid.vacant(new_point):
+                    vacant_points.add(new_point)
                 else:
                     frontier.append(new_point)
 
@@ -534,6 +1035,11 @@ class Line:
     def pop(self) -> Domino:
         return self.line.pop(0)
 
+    def copy(self) -> "Line":
+        new = copy.copy(self)
+        new.line = [list(entry) for entry in self.line]
+        return new
+
     def empty(self) -> bool:
         return not self.line
 
@@ -549,14 +1055,8 @@ class Line:
         self.line[index][0] = player
 
     def __str__(self):
-        return "\n".join(
-            (
-                colored.stylize(" ", colored.bg(player.color.value))
-                if player else str(i)
-            )
-            + f": {domino}"
-            for i, (player, domino) in enumerate(self.line)
-        )
+        from render import RENDERER
+        return RENDERER.line(self)
 
 
 class Dominoes(list):
@@ -589,6 +1089,7 @@ class Dominoes(list):
         ]
 
     def to_json(self, filename: str) -> None:
+        import json
         with open(filename, 'w') as f:
             json.dump(
                 self.to_dict(),
@@ -598,6 +1099,7 @@ class Dominoes(list):
 
     @classmethod
     def from_json(cls, filename):
+        import json
         with open(filename) as f:
             dominos = json.load(f)
             return cls(
@@ -623,23 +1125,50 @@ class Deck:
         dominoes: Dominoes,
         deck_size: int,
         draw_num: int,
+        rng: random.Random=None,
     ):
+        if rng is None:
+            rng = random.Random()
         self.deck_size = deck_size
         self.draw_num = draw_num
-        self.deck = random.sample(dominoes, self.deck_size)
+        self.deck = rng.sample(dominoes, self.deck_size)
+        self.drawn: typing.List[Domino] = []
 
     def empty(self):
         return not bool(self.deck)
 
     def draw(self):
         """Returns n dominos from the shuffled deck."""
-        return [
+        dominoes = [
             self.deck.pop()
             for _ in range(self.draw_num)
         ]
+        self.drawn.extend(dominoes)
+        return dominoes
+
+    def copy(self) -> "Deck":
+        new = copy.copy(self)
+        new.deck = list(self.deck)
+        new.drawn = list(self.drawn)
+        return new
+
+
+class Phase(enum.Enum):
+    SELECT  = enum.auto()
+    PLACE   = enum.auto()
+    OVER    = enum.auto()
+
+
+Action = typing.Union[int, Play, Domino]
 
 
 class Game:
+    """A headless game.
+
+    Players take turns through legal_actions and step. In the SELECT
+    phase an action is an index into the line, in the PLACE phase it is
+    a Play, or the Domino itself to discard it when it cannot be played.
+    """
     boards: typing.Dict[Player, Board]
     line: Line
     turn_num: int = 0
@@ -649,7 +1178,12 @@ class Game:
         dominoes: Dominoes,
         players: typing.List[Player],
         rules: Rule=None,
+        rng: random.Random=None,
     ):
+        if rng is None:
+            rng = random.Random()
+        self.rng = rng
+        self.dominoes = dominoes
         self.players = players
         self.rules = Rule.default(len(self.players))
         self.add_rules(rules)
@@ -658,6 +1192,7 @@ class Game:
             dominoes=dominoes,
             draw_num=self.num_to_draw(),
             deck_size=self.deck_size(),
+            rng=self.rng,
         )
 
         self.boards = {
@@ -667,20 +1202,27 @@ class Game:
 
         self.set_initial_order()
 
+        self.turn_num += 1
+        self.phase = Phase.SELECT
+        self.draw()
+
     def add_rules(self, rules):
         if rules:
             self.rules |= rules
 
     def max_turns(self):
-        if Rule.TWO_PLAYERS in self.rules:
+        if Rule.MIGHTY_DUEL in self.rules:
+            # Two players with two kings each deal all 48 dominoes, four a
+            # turn, so a duel lasts as long as a standard game.
+            return MaxTurns.STANDARD
+        elif Rule.TWO_PLAYERS in self.rules:
             return MaxTurns.TWO_PLAYERS
-        elif Rule.MIGHTY_DUEL in self.rules:
-            return MaxTurns.MIGHTY_DUEL
         else:
             return MaxTurns.STANDARD
 
     def deck_size(self):
         turns = self.max_turns() * len(self.players)
+        # Each player has two kings in two player games.
         if Rule.TWO_PLAYERS in self.rules:
             turns *= 2
         return turns
@@ -688,98 +1230,206 @@ class Game:
     def num_to_draw(self):
         if Rule.THREE_PLAYERS in self.rules:
             return DrawNum.THREE
-        elif self.rules in (
-            Rule.MIGHTY_DUEL,
-            Rule.FOUR_PLAYERS,
-            Rule.TWO_PLAYERS,
+        elif self.rules & (
+            Rule.MIGHTY_DUEL
+            | Rule.FOUR_PLAYERS
+            | Rule.TWO_PLAYERS
         ):
             return DrawNum.FOUR
         else:
             raise ValueError
 
     def set_initial_order(self):
-        self.order = random.sample(self.players, len(self.players))
+        self.order = self.rng.sample(self.players, len(self.players))
         if Rule.TWO_PLAYERS in self.rules:
             self.order *= 2
 
+    def draw(self):
+        self.line = Line(self.deck.draw())
+
+    def copy(self) -> "Game":
+        """Returns a game that can be played on without changing this one."""
+        new = copy.copy(self)
+        new.deck = self.deck.copy()
+        new.boards = {
+            player: board.copy()
+            for player, board in self.boards.items()
+        }
+        new.line = self.line.copy()
+        new.order = list(self.order)
+        return new
+
+    def unseen(self) -> typing.List[Domino]:
+        """Returns the dominoes that have not been drawn yet, some of which
+        may not be in the deck."""
+        drawn = set(self.deck.drawn)
+        return [
+            domino for domino in self.dominoes
+            if domino not in drawn
+        ]
+
+    def over(self) -> bool:
+        return self.phase == Phase.OVER
+
+    def current_player(self) -> typing.Optional[Player]:
+        if self.phase == Phase.SELECT:
+            return self.order[0]
+        if self.phase == Phase.PLACE:
+            return self.line.line[0][0]
+        return None
+
+    def current_domino(self) -> typing.Optional[Domino]:
+        """Returns the domino to be placed in the PLACE phase."""
+        if self.phase == Phase.PLACE:
+            return self.line.line[0][1]
+        return None
+
+    def legal_actions(self) -> typing.List[Action]:
+        if self.phase == Phase.SELECT:
+            return [
+                i for i, (player, _) in enumerate(self.line.line)
+                if player is None
+            ]
+        if self.phase == Phase.PLACE:
+            player, domino = self.line.line[0]
+            return [
+                Play(domino=domino, point=Point(x, y), direction=direction)
+                for x, y, direction
+                in self.boards[player].valid_placements(domino)
+            ] or [domino]
+        return []
+
+    def step(self, action: Action, trusted: bool=False) -> None:
+        """Takes an action for the current player. Trusted actions, such as
+        ones replayed from a record, are not checked."""
+        if self.phase == Phase.SELECT:
+            self._select(action, trusted)
+        elif self.phase == Phase.PLACE:
+            self._place(action, trusted)
+        else:
+            raise InvalidPlay
+
+    def _select(self, index: int, trusted: bool=False) -> None:
+        if not trusted and (
+            not 0 <= index < len(self.line.line) or self.line.line[index][0]
+        ):
+            raise InvalidPlay
+        self.line.choose(self.order.pop(0), index)
+        if not self.order:
+            self.phase = Phase.PLACE
+
+    def _place(
+        self,
+        action: typing.Union[Play, Domino],
+        trusted: bool=False,
+    ) -> None:
+        player, domino = self.line.line[0]
+        board = self.boards[player]
+        if isinstance(action, Domino):
+            if not trusted and (
+                action != domino or board.valid_placements(domino)
+            ):
+                raise InvalidPlay
+            board.discard(domino)
+        elif trusted:
+            board.place(action)
+        else:
+            if action.domino != domino:
+                raise InvalidPlay
+            board.play(action)
+
+        self.line.pop()
+        self.order.append(player)
+        if not self.line.empty():
+            return
+        if self.deck.empty():
+            self.phase = Phase.OVER
+        else:
+            self.turn_num += 1
+            self.phase = Phase.SELECT
+            self.draw()
+
+    def scores(self) -> typing.List[typing.Tuple[int, int, Player]]:
+        """Returns (points, crowns, player) from first to last place."""
+        return sorted(
+            (
+                (
+                    self.boards[player].points(),
+                    self.boards[player].crowns(),
+                    player,
+                )
+                for player in self.players
+            ),
+            reverse=True,
+        )
+
+
+class Terminal:
+    """Plays a Game through input() and print()."""
+
+    def __init__(self, game: Game):
+        self.game = game
+
     def start(self):
-        self.turn_num += 1
-        while not self.deck.empty():
+        while not self.game.over():
             self.turn()
         self.final_score()
 
-    def draw(self):
-        self.line = Line(self.deck.draw())
+    def turn(self):
+        print(f"Turn {self.game.turn_num}/{self.game.max_turns()}")
+        self.select()
+        self.place()
 
     def select(self):
-        while self.order:
-            player = self.order.pop(0)
-            print(self.line)
-            print(self.boards[player])
+        game = self.game
+        while game.phase == Phase.SELECT:
+            player = game.current_player()
+            print(game.line)
+            print(game.boards[player])
             while True:
                 try:
-                    self.line.choose(
-                        player,
-                        int(input(f"{player.name}: ")),
-                    )
+                    game.step(int(input(f"{player.name}: ")))
                 except (InvalidPlay, ValueError):
                     continue
                 else:
                     break
 
     def place(self):
-        while not self.line.empty():
-            player, domino = self.line.pop()
-            board = self.boards[player]
+        game = self.game
+        while game.phase == Phase.PLACE:
+            player = game.current_player()
+            domino = game.current_domino()
+            board = game.boards[player]
 
             print(board)
             print(domino)
+            plays = game.legal_actions()
+            if isinstance(plays[0], Domino):
+                game.step(domino)
+                continue
+            print(plays)
             while True:
                 try:
-                    plays = board.valid_plays(domino)
-                    if not plays:
-                        board.discard(domino)
-                        break
-                    print(plays)
                     x, y, direction = input("x y direction: ").split()
-                    board.play(
+                    game.step(
                         Play(
                             domino=domino,
                             point=Point(int(x), int(y)),
                             direction=Direction.from_string(direction),
                         )
                     )
-                except InvalidPlay:
+                except (InvalidPlay, ValueError, KeyError):
                     continue
                 else:
                     break
 
-            self.order.append(player)
-
-    def turn(self):
-        print(f"Turn {self.turn_num}/{self.max_turns()}")
-        self.draw()
-        self.select()
-        self.place()
-        self.turn_num += 1
-
     def final_score(self):
         for i, (points, crowns, player) in enumerate(
-            sorted(
-                (
-                    (
-                        self.boards[player].points(),
-                        self.boards[player].crowns(),
-                        player,
-                    )
-                    for player in self.players
-                ),
-                reverse=True,
-            ),
+            self.game.scores(),
             start=1
         ):
             print(f"{i}. {player.name}: {points}")
-            print(self.boards[player])
+            print(self.game.boards[player])
 
 def split_stream(func, filename):
     def wrapper(*args, **kwargs):
@@ -792,6 +1442,9 @@ def split_stream(func, filename):
 
 if __name__ == "__main__":
 
+    # Share this module's classes with modules that import game.
+    sys.modules["game"] = sys.modules[__name__]
+
     if len(sys.argv) == 2:
         input = split_stream(input, sys.argv[1])
 
@@ -799,8 +1452,6 @@ if __name__ == "__main__":
 
     dominoes = Dominoes.from_json(filename)
 
-    random.seed(0)
-
     players = [
         Player(
             name=input(f"Player {i+1} name: "),
@@ -815,5 +1466,6 @@ if __name__ == "__main__":
     game = Game(
         dominoes=dominoes,
         players=players,
+        rng=random.Random(0),
     )
-    game.start()
+    Terminal(game).start()
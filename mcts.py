@@ -0,0 +1,211 @@
+import concurrent.futures
+import math
+import random
+import time
+import typing
+
+import bots
+from game import Action, Domino, Game, Play, Player
+
+Key = typing.Hashable
+Statistics = typing.Dict[Key, typing.Tuple[int, float]]
+
+
+def action_key(action: Action) -> Key:
+    """Returns a key that tells apart every distinct action."""
+    if isinstance(action, Play):
+        return action.code
+    if isinstance(action, Domino):
+        return (action.number,)
+    return action
+
+
+def determinize(game: Game, rng: random.Random) -> Game:
+    """Returns a copy of the game with the hidden deck dealt at random from
+    the dominoes that have not been seen."""
+    state = game.copy()
+    state.deck.deck = rng.sample(game.unseen(), len(game.deck.deck))
+    return state
+
+
+def rewards(game: Game) -> typing.Dict[Player, float]:
+    """Splits a reward of 1 between the players in first place."""
+    best = game.scores()[0][:2]
+    winners = [
+        player for points, crowns, player in game.scores()
+        if (points, crowns) == best
+    ]
+    return {
+        player: 1 / len(winners) if player in winners else 0.0
+        for player in game.players
+    }
+
+
+class Node:
+    __slots__ = ("player", "children", "visits", "reward")
+
+    def __init__(self, player: typing.Optional[Player]=None):
+        self.player = player
+        self.children: typing.Dict[Key, "Node"] = {}
+        self.visits = 0
+        self.reward = 0.0
+
+    def ucb(self, parent_visits: int, exploration: float) -> float:
+        return (
+            self.reward / self.visits
+            + exploration * math.sqrt(math.log(parent_visits) / self.visits)
+        )
+
+
+def search(
+    game: Game,
+    rng: random.Random,
+    rollout: bots.Policy,
+    iterations: int=None,
+    seconds: float=None,
+    exploration: float=math.sqrt(2),
+) -> Statistics:
+    """Runs UCT over determinizations of game and returns the visits and
+    total reward of every action from the root."""
+    root = Node()
+    deadline = None if seconds is None else time.perf_counter() + seconds
+    iteration = 0
+    while (
+        (iterations is None or iteration < iterations)
+        and (deadline is None or time.perf_counter() < deadline)
+    ):
+        iteration += 1
+        state = determinize(game, rng)
+        node = root
+        path = [node]
+
+        while not state.over():
+            player = state.current_player()
+            actions = {
+                action_key(action): action
+                for action in state.legal_actions()
+            }
+            untried = [key for key in actions if key not in node.children]
+            if untried:
+                key = rng.choice(untried)
+                node.children[key] = Node(player)
+                node = node.children[key]
+                path.append(node)
+                state.step(actions[key])
+                break
+            key = max(
+                actions,
+                key=lambda key: node.children[key].ucb(node.visits, exploration),
+            )
+            node = node.children[key]
+            path.append(node)
+            state.step(actions[key])
+
+        while not state.over():
+            state.step(rollout.act(state, rng))
+
+        outcome = rewards(state)
+        for node in path:
+            node.visits += 1
+            if node.player is not None:
+                node.reward += outcome[node.player]
+
+        if iterations is None and deadline is None:
+            break
+
+    return {
+        key: (child.visits, child.reward)
+        for key, child in root.children.items()
+    }
+
+
+def _search(
+    game: Game,
+    seed: int,
+    rollout: bots.Policy,
+    iterations: typing.Optional[int],
+    seconds: typing.Optional[float],
+    exploration: float,
+) -> Statistics:
+    return search(
+        game,
+        random.Random(seed),
+        rollout,
+        iterations,
+        seconds,
+        exploration,
+    )
+
+
+class MCTSPolicy(bots.Policy):
+    """UCT over determinized deals, searching the draft and placement alike.
+
+    With workers > 1 every worker process searches the same root with its
+    own seed and budget, and the root statistics are summed.
+    """
+
+    def __init__(
+        self,
+        iterations: int=None,
+        seconds: float=None,
+        exploration: float=math.sqrt(2),
+        rollout: bots.Policy=None,
+        workers: int=1,
+    ):
+        if iterations is None and seconds is None:
+            iterations = 200
+        if rollout is None:
+            rollout = bots.RandomPolicy()
+        self.iterations = iterations
+        self.seconds = seconds
+        self.exploration = exploration
+        self.rollout = rollout
+        self.workers = workers
+        self._executor: typing.Optional[concurrent.futures.Executor] = None
+
+    def __getstate__(self) -> typing.Dict[str, typing.Any]:
+        state = dict(self.__dict__)
+        state["_executor"] = None
+        return state
+
+    def act(self, game: Game, rng: random.Random) -> Action:
+        actions = game.legal_actions()
+        if len(actions) == 1:
+            return actions[0]
+
+        statistics = self.statistics(game, rng)
+        return max(
+            actions,
+            key=lambda action: statistics.get(action_key(action), (0, 0.0)),
+        )
+
+    def statistics(self, game: Game, rng: random.Random) -> Statistics:
+        seeds = [rng.getrandbits(64) for _ in range(self.workers)]
+        arguments = (self.rollout, self.iterations, self.seconds, self.exploration)
+        if self.workers == 1:
+            return _search(game, seeds[0], *arguments)
+
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+        totals: typing.Dict[Key, typing.Tuple[int, float]] = {}
+        for result in self._executor.map(
+            _search,
+            [game] * self.workers,
+            seeds,
+            *([argument] * self.workers for argument in arguments),
+        ):
+            for key, (visits, reward) in result.items():
+                total_visits, total_reward = totals.get(key, (0, 0.0))
+                totals[key] = (total_visits + visits, total_reward + reward)
+        return totals
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(iterations={self.iterations}, "
+            f"seconds={self.seconds}, workers={self.workers})"
+        )
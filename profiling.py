@@ -0,0 +1,288 @@
+"""Opt-in call counters and timers for the engine's hot paths.
+
+Enabling a Profiler wraps the methods in TARGETS on their classes, and
+disabling it puts the originals back, so there is no cost at all while
+it is off. Each wrapped method counts its calls, its cumulative time and
+its own time less any wrapped methods it called. The Game phases are also
+timed per turn, along with the time policies take to decide, each phase
+excluding any phase called within it, so a draw at the end of placing
+counts only as a draw. Each phase is booked under the turn it started in. Results export as a
+JSON summary, or as a marshalled stats file that pstats.Stats can read.
+"""
+import argparse
+import collections
+import json
+import marshal
+import sys
+import time
+import typing
+
+import catalogue
+import simulate
+import unionfind
+from game import Board, Game, Rule
+
+TARGETS: typing.Tuple[typing.Tuple[type, str], ...] = (
+    (Board, "valid_plays"),
+    (Board, "valid_placements"),
+    (Board, "valid_play"),
+    (Board, "_vacant_points"),
+    (Board, "_unionise"),
+    (Board, "points"),
+    (unionfind.UnionFind, "_find"),
+    (unionfind.ArrayUnionFind, "find"),
+    (Game, "draw"),
+    (Game, "_select"),
+    (Game, "_place"),
+) + tuple(
+    (policy, "act")
+    for policy in sorted(
+        set(simulate.POLICIES.values()),
+        key=lambda policy: policy.__name__,
+    )
+    if "act" in policy.__dict__
+)
+
+# Methods timed per turn, by phase name.
+PHASES = {
+    (Game, "draw"): "draw",
+    (Game, "_select"): "select",
+    (Game, "_place"): "place",
+}
+PHASES.update((target, "decide") for target in TARGETS if target[1] == "act")
+
+Key = typing.Tuple[str, int, str]
+
+
+class Record:
+    __slots__ = ("key", "calls", "seconds", "own", "active", "callers")
+
+    def __init__(self, key: Key):
+        self.key = key
+        self.calls = 0
+        self.seconds = 0.0
+        self.own = 0.0
+        self.active = 0
+        # Caller key to [calls, own seconds, cumulative seconds].
+        self.callers: typing.Dict[Key, typing.List[float]] = {}
+
+
+class Profiler:
+    """Times the methods in targets while enabled."""
+
+    def __init__(
+        self,
+        targets: typing.Iterable[typing.Tuple[type, str]]=TARGETS,
+    ):
+        self.targets = tuple(targets)
+        self.records: typing.Dict[str, Record] = {}
+        self.turns: typing.DefaultDict[int, typing.DefaultDict[str, float]] = (
+            collections.defaultdict(lambda: collections.defaultdict(float))
+        )
+        self._originals: typing.List[typing.Tuple[type, str, typing.Callable]] = []
+        self._stack: typing.List[typing.List[typing.Any]] = []
+        # Seconds spent in phases called within each running phase.
+        self._phases: typing.List[typing.List[float]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._originals)
+
+    def enable(self) -> None:
+        if self.enabled:
+            return
+        for owner, name in self.targets:
+            function = owner.__dict__[name]
+            self._originals.append((owner, name, function))
+            setattr(owner, name, self._wrap(owner, name, function))
+
+    def disable(self) -> None:
+        while self._originals:
+            owner, name, function = self._originals.pop()
+            setattr(owner, name, function)
+
+    def __enter__(self) -> "Profiler":
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info: typing.Any) -> None:
+        self.disable()
+
+    def _wrap(
+        self,
+        owner: type,
+        name: str,
+        function: typing.Callable,
+    ) -> typing.Callable:
+        code = function.__code__
+        label = f"{owner.__name__}.{name}"
+        record = self.records.get(label)
+        if record is None:
+            record = self.records[label] = Record(
+                (code.co_filename, code.co_firstlineno, label)
+            )
+        phase = PHASES.get((owner, name))
+        stack = self._stack
+        phases = self._phases
+        turns = self.turns
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            # [record, seconds spent in wrapped callees]
+            frame = [record, 0.0]
+            stack.append(frame)
+            if phase:
+                phases.append([0.0])
+                # Game methods are called on the game, policies get it.
+                # Placing the last domino of a round moves turn_num on, so
+                # the turn is read before the call.
+                turn = (args[0] if isinstance(args[0], Game) else args[1]).turn_num
+            record.active += 1
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                stack.pop()
+                record.active -= 1
+                own = elapsed - frame[1]
+                record.calls += 1
+                record.own += own
+                # Recursive calls are already inside the outer call's time.
+                cumulative = 0.0 if record.active else elapsed
+                record.seconds += cumulative
+                if stack:
+                    caller = stack[-1]
+                    caller[1] += elapsed
+                    counts = record.callers.setdefault(caller[0].key, [0, 0.0, 0.0])
+                    counts[0] += 1
+                    counts[1] += own
+                    counts[2] += cumulative
+                if phase:
+                    nested = phases.pop()[0]
+                    if phases:
+                        phases[-1][0] += elapsed
+                    turns[turn][phase] += elapsed - nested
+
+        wrapper.__wrapped__ = function  # type: ignore
+        wrapper.__name__ = function.__name__
+        wrapper.__qualname__ = function.__qualname__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    def reset(self) -> None:
+        for record in self.records.values():
+            record.calls = 0
+            record.seconds = 0.0
+            record.own = 0.0
+            record.callers.clear()
+        self.turns.clear()
+
+    def summary(self) -> typing.Dict[str, typing.Any]:
+        phases: typing.DefaultDict[str, float] = collections.defaultdict(float)
+        for timings in self.turns.values():
+            for phase, seconds in timings.items():
+                phases[phase] += seconds
+        return {
+            "functions": {
+                label: {
+                    "calls": record.calls,
+                    "seconds": record.seconds,
+                    "own_seconds": record.own,
+                    "per_call_us": record.seconds / record.calls * 1e6
+                    if record.calls else 0.0,
+                }
+                for label, record in sorted(
+                    self.records.items(),
+                    key=lambda item: item[1].seconds,
+                    reverse=True,
+                )
+                if record.calls
+            },
+            "phases": dict(phases),
+            "turns": {
+                str(turn): dict(timings)
+                for turn, timings in sorted(self.turns.items())
+            },
+        }
+
+    def dump_json(self, filename: str) -> None:
+        with open(filename, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def dump_stats(self, filename: str) -> None:
+        """Writes the stats in the format of cProfile.Profile.dump_stats,
+        for pstats.Stats to load."""
+        stats = {
+            record.key: (
+                record.calls,
+                record.calls,
+                record.own,
+                record.seconds,
+                {
+                    caller: (int(calls), int(calls), own, cumulative)
+                    for caller, (calls, own, cumulative) in record.callers.items()
+                },
+            )
+            for record in self.records.values()
+            if record.calls
+        }
+        with open(filename, "wb") as f:
+            marshal.dump(stats, f)
+
+
+PROFILER = Profiler()
+
+
+def enable() -> Profiler:
+    """Enables and returns the default profiler."""
+    PROFILER.enable()
+    return PROFILER
+
+
+def disable() -> Profiler:
+    PROFILER.disable()
+    return PROFILER
+
+
+def main(argv: typing.List[str]=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Play games in this process and profile the hot paths.",
+    )
+    parser.add_argument("games", type=int)
+    parser.add_argument(
+        "--policies",
+        nargs="+",
+        default=["greedy", "greedy"],
+        choices=sorted(simulate.POLICIES),
+        help="one policy per player",
+    )
+    parser.add_argument(
+        "--rules",
+        nargs="*",
+        default=[],
+        choices=[rule.name.lower() for rule in Rule],
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="file to write the JSON summary to")
+    parser.add_argument("--stats", help="file to write pstats data to")
+    args = parser.parse_args(argv)
+
+    dominoes = catalogue.load()
+    policies = [simulate.POLICIES[name]() for name in args.policies]
+    rules = simulate.parse_rules(args.rules)
+    with Profiler() as profiler:
+        for index in range(args.games):
+            simulate.play(dominoes, policies, rules, args.seed, index)
+
+    if args.stats:
+        profiler.dump_stats(args.stats)
+    if args.json:
+        profiler.dump_json(args.json)
+    else:
+        json.dump(profiler.summary(), sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
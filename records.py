@@ -0,0 +1,277 @@
+"""A compact binary format for complete games.
+
+A file is a header followed by length-prefixed game records. Each record
+holds the seed, rules, players and initial order, then for every turn the
+dealt line, the line index picked at each selection and one packed
+(domino number, x, y, direction) placement per domino.
+"""
+import array
+import mmap
+import struct
+import typing
+
+from game import (
+    Action,
+    Direction,
+    Domino,
+    Game,
+    Phase,
+    Play,
+    Player,
+    Point,
+    Rule,
+    TermColor,
+)
+
+MAGIC = b"KDGR"
+VERSION = 1
+HEADER = struct.Struct("<4sB")
+LENGTH = struct.Struct("<I")
+PLACEMENT = struct.Struct("<4B")
+
+DIRECTIONS: typing.Tuple[Direction, ...] = tuple(Direction)
+COLORS: typing.Tuple[TermColor, ...] = tuple(TermColor)
+DISCARD = 0xFF
+
+
+class Placement(typing.NamedTuple):
+    number: int
+    x: int = 0
+    y: int = 0
+    direction: typing.Optional[Direction] = None
+
+    def discarded(self) -> bool:
+        return self.direction is None
+
+
+class Turn(typing.NamedTuple):
+    line: typing.Tuple[int, ...]
+    picks: typing.Tuple[int, ...]
+    placements: typing.Tuple[Placement, ...]
+
+
+class GameRecord(typing.NamedTuple):
+    seed: str
+    rules: Rule
+    players: typing.Tuple[Player, ...]
+    order: typing.Tuple[int, ...]
+    turns: typing.Tuple[Turn, ...]
+
+
+class Recorder:
+    """Steps a game from its start, recording every action."""
+
+    def __init__(self, game: Game, seed: str=""):
+        self.game = game
+        self.seed = seed
+        self.order = tuple(game.players.index(player) for player in game.order)
+        self.turns: typing.List[Turn] = []
+        self._turn()
+
+    def _turn(self) -> None:
+        self.line = tuple(domino.number for _, domino in self.game.line.line)
+        self.picks: typing.List[int] = []
+        self.placements: typing.List[Placement] = []
+
+    def step(self, action: Action) -> None:
+        phase = self.game.phase
+        self.game.step(action)
+
+        if phase == Phase.SELECT:
+            self.picks.append(action)
+            return
+
+        if isinstance(action, Domino):
+            self.placements.append(Placement(action.number))
+        else:
+            self.placements.append(
+                Placement(
+                    action.domino.number,
+                    action.point.x,
+                    action.point.y,
+                    action.direction,
+                )
+            )
+        if self.game.phase != Phase.PLACE:
+            self.turns.append(
+                Turn(self.line, tuple(self.picks), tuple(self.placements))
+            )
+            if self.game.phase == Phase.SELECT:
+                self._turn()
+
+    def record(self) -> GameRecord:
+        return GameRecord(
+            seed=self.seed,
+            rules=self.game.rules,
+            players=tuple(self.game.players),
+            order=self.order,
+            turns=tuple(self.turns),
+        )
+
+
+def _string(string: str) -> bytes:
+    data = string.encode()
+    return bytes((len(data),)) + data
+
+
+def dumps(record: GameRecord) -> bytes:
+    """Returns the record without its length prefix."""
+    parts = [
+        bytes((record.rules.value,)),
+        _string(record.seed),
+        bytes((len(record.players),)),
+    ]
+    for player in record.players:
+        parts.append(bytes((COLORS.index(player.color),)))
+        parts.append(_string(player.name))
+    parts.append(bytes((len(record.order),) + record.order))
+    parts.append(bytes((len(record.turns),)))
+    for turn in record.turns:
+        parts.append(bytes((len(turn.line),) + turn.line))
+        parts.append(bytes(turn.picks))
+        for placement in turn.placements:
+            parts.append(
+                PLACEMENT.pack(
+                    placement.number,
+                    placement.x,
+                    placement.y,
+                    DISCARD if placement.direction is None
+                    else DIRECTIONS.index(placement.direction),
+                )
+            )
+    return b"".join(parts)
+
+
+def loads(data: typing.Union[bytes, memoryview]) -> GameRecord:
+    offset = 0
+
+    def byte() -> int:
+        nonlocal offset
+        offset += 1
+        return data[offset - 1]
+
+    def chunk(size: int) -> bytes:
+        nonlocal offset
+        offset += size
+        return bytes(data[offset - size:offset])
+
+    rules = Rule(byte())
+    seed = chunk(byte()).decode()
+    players = []
+    for _ in range(byte()):
+        color = COLORS[byte()]
+        players.append(Player(name=chunk(byte()).decode(), color=color))
+    order = tuple(chunk(byte()))
+    turns = []
+    for _ in range(byte()):
+        line = tuple(chunk(byte()))
+        picks = tuple(chunk(len(line)))
+        placements = []
+        for _ in line:
+            number, x, y, direction = PLACEMENT.unpack_from(data, offset)
+            offset += PLACEMENT.size
+            placements.append(
+                Placement(number)
+                if direction == DISCARD
+                else Placement(number, x, y, DIRECTIONS[direction])
+            )
+        turns.append(Turn(line, picks, tuple(placements)))
+
+    return GameRecord(
+        seed=seed,
+        rules=rules,
+        players=tuple(players),
+        order=order,
+        turns=tuple(turns),
+    )
+
+
+class Writer:
+    """Appends records to a file, writing the header if it is new."""
+
+    def __init__(self, filename: str):
+        self.file = open(filename, "ab")
+        if self.file.tell() == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION))
+
+    def write(self, record: GameRecord) -> None:
+        data = dumps(record)
+        self.file.write(LENGTH.pack(len(data)) + data)
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "Writer":
+        return self
+
+    def __exit__(self, *exc_info: typing.Any) -> None:
+        self.close()
+
+
+def read(filename: str) -> typing.Iterator[GameRecord]:
+    """Yields the records of a file one at a time from a memory map."""
+    with open(filename, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        magic, version = HEADER.unpack_from(data)
+        if (magic, version) != (MAGIC, VERSION):
+            raise ValueError(f"{filename} is not a version {VERSION} game record")
+        view = memoryview(data)
+        try:
+            offset = HEADER.size
+            while offset < len(data):
+                (length,) = LENGTH.unpack_from(data, offset)
+                offset += LENGTH.size
+                yield loads(view[offset:offset + length])
+                offset += length
+        finally:
+            view.release()
+
+
+class Archive:
+    """Random access to the records of a file through a memory map."""
+
+    def __init__(self, filename: str):
+        self.file = open(filename, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = HEADER.unpack_from(self.data)
+        if (magic, version) != (MAGIC, VERSION):
+            raise ValueError(f"{filename} is not a version {VERSION} game record")
+
+        self.offsets = array.array("Q")
+        offset = HEADER.size
+        while offset < len(self.data):
+            self.offsets.append(offset)
+            (length,) = LENGTH.unpack_from(self.data, offset)
+            offset += LENGTH.size + length
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, index: int) -> GameRecord:
+        offset = self.offsets[index]
+        (length,) = LENGTH.unpack_from(self.data, offset)
+        start = offset + LENGTH.size
+        return loads(self.data[start:start + length])
+
+    def close(self) -> None:
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, *exc_info: typing.Any) -> None:
+        self.close()
+
+
+def to_play(placement: Placement, dominoes: typing.Sequence[Domino]) -> Action:
+    """Returns the action for a placement, given dominoes by number - 1."""
+    domino = dominoes[placement.number - 1]
+    if placement.direction is None:
+        return domino
+    return Play(
+        domino=domino,
+        point=Point(placement.x, placement.y),
+        direction=placement.direction,
+    )
@@ -0,0 +1,183 @@
+"""Renders grids, lines and boards for the terminal.
+
+The string for each tile is built once per renderer. Grids are drawn
+only within the bounding box of their tiles, and a GridView redraws just
+the cells that changed since its last draw by moving the cursor. Plain
+renderers draw two characters a cell, suit letter then crowns, with no
+escape codes.
+"""
+import typing
+
+from game import Domino, Grid, Line, Player, Suit, Tile
+
+LETTERS = {
+    Suit.FOREST:    "F",
+    Suit.GRASS:     "G",
+    Suit.MINE:      "M",
+    Suit.SWAMP:     "S",
+    Suit.WATER:     "W",
+    Suit.WHEAT:     "H",
+    Suit.CASTLE:    "C",
+    Suit.NONE:      "?",
+}
+
+SAVE = "\x1b7"
+RESTORE = "\x1b8"
+
+Box = typing.Tuple[int, int, int, int]
+
+
+class Renderer:
+
+    def __init__(self, color: bool=True):
+        self.color = color
+        self.width = 1 if color else 2
+        self.empty = " " * self.width
+        self._tiles: typing.Dict[Tile, str] = {}
+        self._players: typing.Dict[Player, str] = {}
+
+    def tile(self, tile: typing.Optional[Tile]) -> str:
+        if tile is None:
+            return self.empty
+        string = self._tiles.get(tile)
+        if string is None:
+            string = self._tiles[tile] = self._render_tile(tile)
+        return string
+
+    def _render_tile(self, tile: Tile) -> str:
+        if not self.color:
+            return LETTERS[tile.suit] + (str(tile.crowns) if tile.crowns else " ")
+        import colored  # type: ignore
+
+        if tile.suit == Suit.CASTLE:
+            char = "C"
+        elif tile.crowns == 0:
+            char = " "
+        else:
+            char = str(tile.crowns)
+        return colored.stylize(
+            char,
+            colored.fg("white") + colored.bg(tile.suit.to_color().value),
+        )
+
+    def domino(self, domino: Domino) -> str:
+        return self.tile(domino.left) + self.tile(domino.right)
+
+    def player(self, player: Player) -> str:
+        string = self._players.get(player)
+        if string is None:
+            if self.color:
+                import colored  # type: ignore
+
+                string = colored.stylize(" ", colored.bg(player.color.value))
+            else:
+                string = player.name
+            self._players[player] = string
+        return string
+
+    def line(self, line: Line) -> str:
+        return "\n".join(
+            (self.player(player) if player else str(i))
+            + ": "
+            + self.domino(domino)
+            for i, (player, domino) in enumerate(line.line)
+        )
+
+    @staticmethod
+    def box(grid: Grid, margin: int=0) -> Box:
+        """Returns the (min_x, min_y, max_x, max_y) of the tiles, widened by
+        margin but kept within the grid."""
+        last = grid.max_size - 1
+        return (
+            max(grid.min_x - margin, 0),
+            max(grid.min_y - margin, 0),
+            min(grid.max_x + margin, last),
+            min(grid.max_y + margin, last),
+        )
+
+    def widths(self, grid: Grid) -> typing.Tuple[int, int]:
+        """Returns the widths of the row labels and of each cell, with a
+        space between column labels once they take more than one digit."""
+        label = len(str(grid.max_size - 1))
+        if label == 1:
+            return label, self.width
+        return label, max(self.width, label + 1)
+
+    def cell(self, tile: typing.Optional[Tile], width: int) -> str:
+        return self.tile(tile) + " " * (width - self.width)
+
+    def grid(self, grid: Grid, box: Box=None) -> str:
+        """Returns the grid within box, the tiles' bounding box by default,
+        labelled with x down the side and y along the top."""
+        if box is None:
+            box = self.box(grid)
+        min_x, min_y, max_x, max_y = box
+        points = grid.tables.points
+        max_size = grid.max_size
+        label, width = self.widths(grid)
+        return "".join((
+            "\n",
+            "↓".ljust(label),
+            "".join(
+                str(y).ljust(width)
+                for y in range(min_y, max_y + 1)
+            ),
+            "\n",
+            "\n".join(
+                str(x).ljust(label)
+                + "".join(
+                    self.cell(grid[points[x * max_size + y]], width)
+                    for y in range(min_y, max_y + 1)
+                )
+                for x in range(min_x, max_x + 1)
+            ),
+        ))
+
+
+class GridView:
+    """Keeps a grid drawn on the terminal up to date.
+
+    The first draw prints the whole grid. After that, as long as the
+    cursor is left just below the drawing, each draw returns escape codes
+    that rewrite only the cells that changed.
+    """
+
+    def __init__(self, renderer: Renderer, grid: Grid):
+        self.renderer = renderer
+        self.box: Box = (0, 0, grid.max_size - 1, grid.max_size - 1)
+        self.cells: typing.Optional[typing.Dict[int, str]] = None
+
+    def _cells(self, grid: Grid) -> typing.Dict[int, str]:
+        min_x, min_y, max_x, max_y = self.box
+        points = grid.tables.points
+        _, width = self.renderer.widths(grid)
+        return {
+            cell: self.renderer.cell(grid[points[cell]], width)
+            for cell in (
+                x * grid.max_size + y
+                for x in range(min_x, max_x + 1)
+                for y in range(min_y, max_y + 1)
+            )
+        }
+
+    def draw(self, grid: Grid) -> str:
+        cells = self._cells(grid)
+        if self.cells is None:
+            self.cells = cells
+            return self.renderer.grid(grid, self.box) + "\n"
+
+        min_x, min_y, max_x, max_y = self.box
+        label, width = self.renderer.widths(grid)
+        moves = []
+        for cell, string in cells.items():
+            if self.cells[cell] == string:
+                continue
+            x, y = divmod(cell, grid.max_size)
+            up = max_x + 1 - x
+            column = label + 1 + (y - min_y) * width
+            moves.append(f"{SAVE}\x1b[{up}A\x1b[{column}G{string}{RESTORE}")
+        self.cells = cells
+        return "".join(moves)
+
+
+RENDERER = Renderer()
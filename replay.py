@@ -0,0 +1,105 @@
+import random
+import typing
+
+import catalogue
+import records
+from game import Action, Domino, Game, InvalidPlay, Line, Phase
+
+
+def start(
+    record: records.GameRecord,
+    dominoes: typing.Sequence[Domino]=catalogue.CATALOGUE,
+) -> Game:
+    """Returns the game of a record at the start of its first turn, dealt
+    from the recorded lines rather than the random seed."""
+    game = Game(
+        dominoes=dominoes,
+        players=list(record.players),
+        rules=record.rules,
+        rng=random.Random(record.seed),
+    )
+    lines = [
+        [dominoes[number - 1] for number in turn.line]
+        for turn in record.turns
+    ]
+    game.order = [game.players[i] for i in record.order]
+    game.deck.deck = [
+        domino
+        for line in reversed(lines[1:])
+        for domino in reversed(line)
+    ]
+    game.deck.drawn = list(lines[0])
+    game.line = Line(lines[0])
+    return game
+
+
+def actions(
+    turn: records.Turn,
+    dominoes: typing.Sequence[Domino]=catalogue.CATALOGUE,
+) -> typing.List[Action]:
+    """Returns the picks then placements of a turn, in the order taken."""
+    return list(turn.picks) + [
+        records.to_play(placement, dominoes)
+        for placement in turn.placements
+    ]
+
+
+class Replay:
+    """Reconstructs the game of a record at any turn.
+
+    Recorded actions are trusted rather than validated. The game at the
+    start of every interval-th turn is kept, so seeking replays at most
+    interval turns.
+    """
+
+    def __init__(
+        self,
+        record: records.GameRecord,
+        dominoes: typing.Sequence[Domino]=catalogue.CATALOGUE,
+        interval: int=4,
+    ):
+        self.record = record
+        self.dominoes = dominoes
+        self.interval = interval
+        self.snapshots: typing.Dict[int, Game] = {1: start(record, dominoes)}
+
+    def __len__(self) -> int:
+        return len(self.record.turns)
+
+    def seek(self, turn: int, step: int=0) -> Game:
+        """Returns a new game at the start of turn (from 1), after its
+        first step actions. Turn len(self) + 1 is the end of the game."""
+        if not 1 <= turn <= len(self) + 1:
+            raise IndexError(turn)
+
+        snapshot = max(
+            number for number in self.snapshots
+            if number <= turn
+        )
+        game = self.snapshots[snapshot].copy()
+        for number in range(snapshot, turn):
+            for action in actions(self.record.turns[number - 1], self.dominoes):
+                game.step(action, trusted=True)
+            if (number + 1) % self.interval == 1 and number + 1 not in self.snapshots:
+                self.snapshots[number + 1] = game.copy()
+
+        if step:
+            for action in actions(self.record.turns[turn - 1], self.dominoes)[:step]:
+                game.step(action, trusted=True)
+        return game
+
+    def verify(self) -> Game:
+        """Replays every action through the usual checks and returns the
+        final game, raising InvalidPlay at the first illegal one."""
+        game = start(self.record, self.dominoes)
+        for number, turn in enumerate(self.record.turns, start=1):
+            if game.phase != Phase.SELECT or game.turn_num != number:
+                raise InvalidPlay(f"turn {number} was not expected")
+            for action in actions(turn, self.dominoes):
+                try:
+                    game.step(action)
+                except InvalidPlay as e:
+                    raise InvalidPlay(f"turn {number}: {action!r}") from e
+        if not game.over():
+            raise InvalidPlay("the game did not finish")
+        return game
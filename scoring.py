@@ -0,0 +1,174 @@
+"""Scores many boards at once with NumPy.
+
+Boards are given as an (N, S, S) array of suits, using Suit.value for
+tiles and 0 for empty cells, and an (N, S, S) array of crowns. Regions
+are labelled with scipy.ndimage when it is installed and by label
+propagation otherwise.
+"""
+import typing
+
+import numpy as np
+
+from game import Board, BonusPoints, Play, Rule, Suit
+
+try:
+    from scipy import ndimage  # type: ignore
+except ImportError:
+    ndimage = None
+
+EMPTY = 0
+CASTLE = Suit.CASTLE.value
+SUITS = tuple(suit.value for suit in Suit if suit not in (Suit.CASTLE, Suit.NONE))
+
+# Connects cells within a board but never across boards.
+STRUCTURE = np.zeros((3, 3, 3), dtype=bool)
+STRUCTURE[1] = [[0, 1, 0], [1, 1, 1], [0, 1, 0]]
+
+
+def _label_scipy(suits: np.ndarray) -> np.ndarray:
+    labels = np.zeros(suits.shape, dtype=np.int64)
+    offset = 0
+    for suit in SUITS:
+        suit_labels, count = ndimage.label(suits == suit, structure=STRUCTURE)
+        found = suit_labels > 0
+        labels[found] = suit_labels[found] + offset
+        offset += count
+    return labels
+
+
+def _label_numpy(suits: np.ndarray) -> np.ndarray:
+    """Labels each region with one more than its smallest flat cell index,
+    by taking the minimum label of same suit neighbours until nothing
+    changes, jumping through labels to converge faster."""
+    tiles = (suits != EMPTY) & (suits != CASTLE)
+    size = suits.size
+    labels = np.where(tiles, np.arange(1, size + 1).reshape(suits.shape), 0)
+    # A label one past the last cell means no neighbour.
+    none = size + 1
+    across = tiles[:, :, :-1] & (suits[:, :, :-1] == suits[:, :, 1:])
+    down = tiles[:, :-1, :] & (suits[:, :-1, :] == suits[:, 1:, :])
+
+    while True:
+        current = np.where(tiles, labels, none)
+        new = current.copy()
+        np.minimum(new[:, :, :-1], np.where(across, current[:, :, 1:], none), out=new[:, :, :-1])
+        np.minimum(new[:, :, 1:], np.where(across, current[:, :, :-1], none), out=new[:, :, 1:])
+        np.minimum(new[:, :-1, :], np.where(down, current[:, 1:, :], none), out=new[:, :-1, :])
+        np.minimum(new[:, 1:, :], np.where(down, current[:, :-1, :], none), out=new[:, 1:, :])
+        new = np.where(tiles, new, 0)
+
+        flat = np.concatenate(([0], new.ravel()))
+        new = flat[new]
+
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+
+def label(suits: np.ndarray) -> np.ndarray:
+    """Returns an array of region labels, unique across the batch, with 0
+    for empty cells and the castle."""
+    if ndimage is not None:
+        return _label_scipy(suits)
+    return _label_numpy(suits)
+
+
+def region_points(
+    suits: np.ndarray,
+    crowns: np.ndarray,
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Returns the points and crowns of the regions of each board."""
+    count = suits.shape[0]
+    labels = label(suits).ravel()
+    boards = np.repeat(np.arange(count), suits.shape[1] * suits.shape[2])
+
+    sizes = np.bincount(labels, minlength=1)
+    region_crowns = np.bincount(labels, weights=crowns.ravel(), minlength=1)
+    region_boards = np.zeros(len(sizes), dtype=np.int64)
+    region_boards[labels] = boards
+    scoring = sizes > 0
+    scoring[0] = False
+
+    points = np.bincount(
+        region_boards[scoring],
+        weights=(sizes * region_crowns)[scoring],
+        minlength=count,
+    )
+    total_crowns = np.bincount(
+        region_boards[scoring],
+        weights=region_crowns[scoring],
+        minlength=count,
+    )
+    return points.astype(np.int64), total_crowns.astype(np.int64)
+
+
+def bounded(suits: np.ndarray) -> np.ndarray:
+    """Returns whether each board fits within the square centred on its
+    castle, like Grid.bounded."""
+    max_size = suits.shape[1]
+    middle = max_size // 2
+    half = (max_size + 1) // 2 // 2
+    outside = np.ones((max_size, max_size), dtype=bool)
+    outside[middle - half:middle + half + 1, middle - half:middle + half + 1] = False
+    return ~((suits != EMPTY) & outside).any(axis=(1, 2))
+
+
+def score(
+    suits: np.ndarray,
+    crowns: np.ndarray,
+    rules: Rule,
+    discarded: np.ndarray=None,
+) -> np.ndarray:
+    """Returns the points of each board, like Board.points."""
+    points, _ = region_points(suits, crowns)
+    if Rule.MIDDLE_KINGDOM in rules:
+        points += BonusPoints.MIDDLE_KINGDOM * bounded(suits)
+    if Rule.HARMONY in rules:
+        if discarded is None:
+            discarded = np.zeros(len(suits), dtype=bool)
+        points += BonusPoints.HARMONY * ~discarded
+    return points
+
+
+def arrays(board: Board) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Returns the suit and crown arrays of a board."""
+    size = board.grid.max_size
+    suits = np.zeros((size, size), dtype=np.int8)
+    crowns = np.zeros((size, size), dtype=np.int8)
+    for x, row in enumerate(board.grid.grid):
+        for y, tile in enumerate(row):
+            if tile is not None:
+                suits[x, y] = tile.suit.value
+                crowns[x, y] = tile.crowns
+    return suits, crowns
+
+
+def score_boards(boards: typing.Sequence[Board], rules: Rule) -> np.ndarray:
+    suits, crowns = zip(*(arrays(board) for board in boards))
+    return score(
+        np.stack(suits),
+        np.stack(crowns),
+        rules,
+        np.array([bool(board.discards) for board in boards]),
+    )
+
+
+def score_plays(board: Board, plays: typing.Sequence[Play]) -> np.ndarray:
+    """Returns the points the board would have after each play."""
+    suits, crowns = arrays(board)
+    count = len(plays)
+    suits = np.repeat(suits[np.newaxis], count, axis=0)
+    crowns = np.repeat(crowns[np.newaxis], count, axis=0)
+    index = np.arange(count)
+    for side in (0, 1):
+        x = [play.points[side].x for play in plays]
+        y = [play.points[side].y for play in plays]
+        tiles = [play.domino[side + 1] for play in plays]
+        suits[index, x, y] = [tile.suit.value for tile in tiles]
+        crowns[index, x, y] = [tile.crowns for tile in tiles]
+    return score(
+        suits,
+        crowns,
+        board.rules,
+        np.full(count, bool(board.discards)),
+    )
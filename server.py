@@ -0,0 +1,441 @@
+"""Hosts many games at once over TCP on one asyncio event loop.
+
+Messages are JSON objects, one per line. A client joins with
+
+    {"type": "join", "name": "Ann", "players": 2, "rules": [], "bots": 1}
+
+and is seated once the table has enough clients, with any bot seats
+filled by the named policy. Whenever it is the client's move the server
+sends the game state with "actions" and a "move" number, and waits for
+an action echoing that number
+
+    {"type": "action", "move": 7, "index": 2}
+    {"type": "action", "move": 7, "x": 4, "y": 5, "direction": "east"}
+    {"type": "action", "move": 7, "discard": true}
+
+A client that does not answer in time, or that disconnects, has a random
+legal action played for it, and a late answer is dropped as stale. Bots run in a process pool so that their
+searches never block the event loop.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import random
+import typing
+
+import bots
+import catalogue
+import simulate
+from game import (
+    Action,
+    Direction,
+    Domino,
+    Dominoes,
+    Game,
+    InvalidPlay,
+    Phase,
+    Play,
+    Player,
+    Point,
+    Rule,
+    TermColor,
+)
+
+Message = typing.Dict[str, typing.Any]
+
+
+def state(game: Game) -> Message:
+    """Returns what every player can see of the game."""
+    player = game.current_player()
+    return {
+        "type": "state",
+        "turn": game.turn_num,
+        "phase": game.phase.name.lower(),
+        "player": player.name if player else None,
+        "line": [
+            [owner.name if owner else None, domino.number]
+            for owner, domino in game.line.line
+        ],
+        "boards": {
+            player.name: [
+                [
+                    None if tile is None
+                    else [tile.suit.name.lower(), tile.crowns]
+                    for tile in row
+                ]
+                for row in board.grid.grid
+            ]
+            for player, board in game.boards.items()
+        },
+        "scores": {
+            player.name: [points, crowns]
+            for points, crowns, player in game.scores()
+        },
+    }
+
+
+def to_json(action: Action) -> Message:
+    if isinstance(action, int):
+        return {"index": action}
+    if isinstance(action, Domino):
+        return {"discard": True}
+    return {
+        "x": action.point.x,
+        "y": action.point.y,
+        "direction": action.direction.name.lower(),
+    }
+
+
+def from_json(message: Message, game: Game) -> Action:
+    """Returns the action a message asks for, raising InvalidPlay if it is
+    not legal."""
+    try:
+        if game.phase == Phase.SELECT:
+            action: Action = int(message["index"])
+        elif message.get("discard"):
+            action = game.current_domino()
+        else:
+            action = Play(
+                domino=game.current_domino(),
+                point=Point(int(message["x"]), int(message["y"])),
+                direction=Direction.from_string(message["direction"]),
+            )
+    except (KeyError, TypeError, ValueError):
+        raise InvalidPlay
+    if isinstance(action, Play):
+        legal = game.boards[game.current_player()].valid_play(action)
+    elif isinstance(action, Domino):
+        legal = isinstance(game.legal_actions()[0], Domino)
+    else:
+        legal = action in game.legal_actions()
+    if not legal:
+        raise InvalidPlay
+    return action
+
+
+class Connection:
+    """JSON lines over a stream."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+
+    async def send(self, message: Message) -> None:
+        if self.closed:
+            return
+        try:
+            self.writer.write(json.dumps(message).encode() + b"\n")
+            await self.writer.drain()
+        except ConnectionError:
+            self.closed = True
+
+    async def receive(self) -> Message:
+        """Returns the next message, raising EOFError once the client has
+        gone."""
+        while True:
+            try:
+                line = await self.reader.readline()
+            except (ConnectionError, ValueError):
+                # readline raises ValueError for lines over the stream limit.
+                line = b""
+            if not line:
+                self.closed = True
+                raise EOFError
+            try:
+                message = json.loads(line)
+            except ValueError:
+                await self.send({"type": "error", "message": "invalid JSON"})
+                continue
+            if isinstance(message, dict):
+                return message
+            await self.send({"type": "error", "message": "expected an object"})
+
+    async def close(self) -> None:
+        self.closed = True
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+class Seat:
+    """Chooses the actions of one player."""
+
+    async def act(self, game: Game) -> Action:
+        raise NotImplementedError
+
+    async def send(self, message: Message) -> None:
+        pass
+
+
+def _act(policy: bots.Policy, game: Game, seed: int) -> Action:
+    return policy.act(game, random.Random(seed))
+
+
+class BotSeat(Seat):
+    """Runs a policy, in an executor when one is given."""
+
+    def __init__(
+        self,
+        policy: bots.Policy,
+        rng: random.Random,
+        executor: concurrent.futures.Executor=None,
+    ):
+        self.policy = policy
+        self.rng = rng
+        self.executor = executor
+
+    async def act(self, game: Game) -> Action:
+        seed = self.rng.getrandbits(64)
+        if self.executor is None:
+            return _act(self.policy, game, seed)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            _act,
+            self.policy,
+            game,
+            seed,
+        )
+
+
+class ClientSeat(Seat):
+    """Waits for a client to choose, up to timeout seconds a move."""
+
+    def __init__(
+        self,
+        connection: Connection,
+        rng: random.Random,
+        timeout: float,
+    ):
+        self.connection = connection
+        self.rng = rng
+        self.timeout = timeout
+        self.move = 0
+
+    async def send(self, message: Message) -> None:
+        await self.connection.send(message)
+
+    async def act(self, game: Game) -> Action:
+        actions = game.legal_actions()
+        self.move += 1
+        if not self.connection.closed:
+            await self.send(
+                dict(
+                    state(game),
+                    move=self.move,
+                    actions=[to_json(action) for action in actions],
+                )
+            )
+            try:
+                return await asyncio.wait_for(self._receive(game), self.timeout)
+            except asyncio.TimeoutError:
+                await self.send({"type": "timeout"})
+            except EOFError:
+                pass
+        return self.rng.choice(actions)
+
+    async def _receive(self, game: Game) -> Action:
+        while True:
+            message = await self.connection.receive()
+            if message.get("type") != "action":
+                await self.send({"type": "error", "message": "expected an action"})
+                continue
+            if message.get("move") != self.move:
+                await self.send({"type": "error", "message": "stale action"})
+                continue
+            try:
+                return from_json(message, game)
+            except InvalidPlay:
+                await self.send({"type": "error", "message": "invalid action"})
+
+
+class Table:
+    """A game and the seats playing it."""
+
+    def __init__(
+        self,
+        dominoes: Dominoes,
+        seats: typing.Sequence[typing.Tuple[str, Seat]],
+        rules: Rule=None,
+        rng: random.Random=None,
+    ):
+        if rng is None:
+            rng = random.Random()
+        players = [
+            Player(name=name, color=color)
+            for (name, _), color in zip(seats, TermColor)
+        ]
+        self.seats = {
+            player: seat
+            for player, (_, seat) in zip(players, seats)
+        }
+        self.game = Game(dominoes=dominoes, players=players, rules=rules, rng=rng)
+
+    async def broadcast(self, message: Message) -> None:
+        await asyncio.gather(*(seat.send(message) for seat in self.seats.values()))
+
+    async def play(self) -> typing.List[typing.Tuple[int, int, Player]]:
+        game = self.game
+        while not game.over():
+            game.step(await self.seats[game.current_player()].act(game), trusted=True)
+        scores = game.scores()
+        await self.broadcast(dict(state(game), type="over"))
+        return scores
+
+
+class Lobby(typing.NamedTuple):
+    players: int
+    rules: typing.Optional[Rule]
+    bots: int
+    policy: str
+
+
+class Server:
+    """Seats clients at tables as they join and plays the tables
+    concurrently."""
+
+    def __init__(
+        self,
+        dominoes: Dominoes,
+        timeout: float=30,
+        executor: concurrent.futures.Executor=None,
+        seed: int=None,
+    ):
+        self.dominoes = dominoes
+        self.timeout = timeout
+        self.executor = executor
+        self.rng = random.Random(seed)
+        self.waiting: typing.Dict[Lobby, typing.List[typing.Tuple[str, Connection]]] = {}
+        self.tables: typing.Set[asyncio.Task] = set()
+        self.ids = itertools.count(1)
+
+    async def handle(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        connection = Connection(reader, writer)
+        try:
+            lobby, name = self._join(await connection.receive())
+        except EOFError:
+            await connection.close()
+            return
+        except (KeyError, TypeError, ValueError) as e:
+            await connection.send({"type": "error", "message": f"invalid join: {e}"})
+            await connection.close()
+            return
+
+        waiting = self.waiting.setdefault(lobby, [])
+        waiting.append((name, connection))
+        await connection.send({"type": "waiting", "players": len(waiting)})
+        if len(waiting) == lobby.players - lobby.bots:
+            del self.waiting[lobby]
+            task = asyncio.create_task(self._play(lobby, waiting))
+            self.tables.add(task)
+            task.add_done_callback(self.tables.discard)
+
+    @staticmethod
+    def _join(message: Message) -> typing.Tuple[Lobby, str]:
+        if message.get("type") != "join":
+            raise ValueError("expected a join")
+        lobby = Lobby(
+            players=int(message.get("players", 2)),
+            rules=simulate.parse_rules(message.get("rules", [])),
+            bots=int(message.get("bots", 0)),
+            policy=str(message.get("policy", "greedy")),
+        )
+        if lobby.policy not in simulate.POLICIES:
+            raise ValueError(f"unknown policy {lobby.policy}")
+        if not 0 <= lobby.bots < lobby.players <= len(TermColor):
+            raise ValueError("invalid number of players or bots")
+        return lobby, str(message["name"])
+
+    async def _play(
+        self,
+        lobby: Lobby,
+        clients: typing.List[typing.Tuple[str, Connection]],
+    ) -> None:
+        table_id = next(self.ids)
+        seats: typing.List[typing.Tuple[str, Seat]] = [
+            (
+                name,
+                ClientSeat(
+                    connection,
+                    random.Random(self.rng.getrandbits(64)),
+                    self.timeout,
+                ),
+            )
+            for name, connection in clients
+        ]
+        policy = simulate.POLICIES[lobby.policy]()
+        seats += [
+            (
+                f"Bot {i + 1}",
+                BotSeat(policy, random.Random(self.rng.getrandbits(64)), self.executor),
+            )
+            for i in range(lobby.bots)
+        ]
+        try:
+            table = Table(
+                self.dominoes,
+                seats,
+                lobby.rules,
+                random.Random(self.rng.getrandbits(64)),
+            )
+            for i, seat in enumerate(table.seats.values()):
+                await seat.send({"type": "seated", "table": table_id, "seat": i})
+            await table.play()
+        finally:
+            await asyncio.gather(
+                *(connection.close() for _, connection in clients)
+            )
+
+    async def serve(self, host: str="127.0.0.1", port: int=8765) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv: typing.List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Host games over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=30,
+        help="seconds a client has for each move",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="processes for bots, or 0 to run them on the event loop",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    dominoes = catalogue.load()
+    executor = None
+    if args.workers != 0:
+        executor = concurrent.futures.ProcessPoolExecutor(args.workers)
+    try:
+        asyncio.run(
+            Server(dominoes, args.timeout, executor, args.seed).serve(
+                args.host,
+                args.port,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
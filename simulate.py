@@ -0,0 +1,207 @@
+import argparse
+import concurrent.futures
+import functools
+import json
+import os
+import random
+import typing
+
+import bots
+import catalogue
+import draft
+import endgame
+import mcts
+import records
+from game import Domino, Dominoes, Game, Player, Rule, TermColor
+
+
+class GameResult(typing.NamedTuple):
+    index: int
+    seed: str
+    rules: Rule
+    points: typing.Tuple[int, ...]
+    crowns: typing.Tuple[int, ...]
+    turns: int
+    record: typing.Optional[records.GameRecord] = None
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "index": self.index,
+            "seed": self.seed,
+            "rules": self.rules.value,
+            "points": self.points,
+            "crowns": self.crowns,
+            "turns": self.turns,
+        }
+
+
+def game_seed(seed: int, index: int) -> str:
+    """Returns the seed of a game, which only depends on its index."""
+    return f"{seed}:{index}"
+
+
+def play(
+    dominoes: Dominoes,
+    policies: typing.Sequence[bots.Policy],
+    rules: Rule=None,
+    seed: int=0,
+    index: int=0,
+    record: bool=False,
+) -> GameResult:
+    """Plays one game, the player in seat i using policies[i]."""
+    players = [
+        Player(name=f"Player {i + 1}", color=color)
+        for i, color in zip(range(len(policies)), TermColor)
+    ]
+    seats = dict(zip(players, policies))
+    rng = random.Random(game_seed(seed, index))
+    game = Game(
+        dominoes=dominoes,
+        players=players,
+        rules=rules,
+        rng=rng,
+    )
+    recorder = records.Recorder(game, game_seed(seed, index))
+    step = recorder.step if record else game.step
+    while not game.over():
+        step(seats[game.current_player()].act(game, rng))
+
+    return GameResult(
+        index=index,
+        seed=game_seed(seed, index),
+        rules=game.rules,
+        points=tuple(game.boards[player].points() for player in players),
+        crowns=tuple(game.boards[player].crowns() for player in players),
+        turns=game.turn_num,
+        record=recorder.record() if record else None,
+    )
+
+
+POLICIES: typing.Dict[str, typing.Type[bots.Policy]] = dict(
+    bots.POLICIES,
+    draft=draft.DraftPolicy,
+    endgame=endgame.EndgamePolicy,
+    mcts=mcts.MCTSPolicy,
+)
+
+_dominoes: typing.Optional[typing.Sequence[Domino]] = None
+
+
+def _init_worker(filename: str) -> None:
+    global _dominoes
+    if filename == catalogue.FILENAME:
+        _dominoes = catalogue.CATALOGUE
+    else:
+        _dominoes = catalogue.load(filename)
+
+
+def _play_shard(
+    policies: typing.Sequence[bots.Policy],
+    rules: typing.Optional[Rule],
+    seed: int,
+    record: bool,
+    indices: range,
+) -> typing.List[GameResult]:
+    assert _dominoes is not None
+    return [
+        play(_dominoes, policies, rules, seed, index, record)
+        for index in indices
+    ]
+
+
+def shards(games: int, size: int) -> typing.Iterator[range]:
+    for start in range(0, games, size):
+        yield range(start, min(start + size, games))
+
+
+def simulate(
+    games: int,
+    policies: typing.Sequence[bots.Policy],
+    rules: Rule=None,
+    seed: int=0,
+    workers: int=None,
+    shard_size: int=16,
+    filename: str=catalogue.FILENAME,
+    record: bool=False,
+) -> typing.Iterator[GameResult]:
+    """Plays games across a process pool, yielding each result as its
+    shard finishes.
+
+    Every game is seeded from seed and its index alone, so results do not
+    depend on the number of workers or the order shards complete in.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    play_shard = functools.partial(_play_shard, policies, rules, seed, record)
+
+    if workers == 1:
+        _init_worker(filename)
+        for indices in shards(games, shard_size):
+            yield from play_shard(indices)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(filename,),
+    ) as executor:
+        futures = [
+            executor.submit(play_shard, indices)
+            for indices in shards(games, shard_size)
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            yield from future.result()
+
+
+def parse_rules(names: typing.Iterable[str]) -> typing.Optional[Rule]:
+    rules = None
+    for name in names:
+        rule = Rule[name.upper()]
+        rules = rule if rules is None else rules | rule
+    return rules
+
+
+def main(argv: typing.List[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Play games between bots.")
+    parser.add_argument("games", type=int)
+    parser.add_argument(
+        "--policies",
+        nargs="+",
+        default=["random", "random"],
+        choices=sorted(POLICIES),
+        help="one policy per player",
+    )
+    parser.add_argument(
+        "--rules",
+        nargs="*",
+        default=[],
+        choices=[rule.name.lower() for rule in Rule],
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=16)
+    parser.add_argument("--record", help="file to append game records to")
+    args = parser.parse_args(argv)
+
+    writer = records.Writer(args.record) if args.record else None
+    try:
+        for result in simulate(
+            games=args.games,
+            policies=[POLICIES[name]() for name in args.policies],
+            rules=parse_rules(args.rules),
+            seed=args.seed,
+            workers=args.workers,
+            shard_size=args.shard_size,
+            record=writer is not None,
+        ):
+            if writer is not None:
+                writer.write(result.record)
+            print(json.dumps(result.to_dict()))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+if __name__ == "__main__":
+    main()
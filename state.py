@@ -0,0 +1,310 @@
+"""Game state packed into one flat buffer of bytes.
+
+The buffer holds a header, the order, the line, the deck as a
+permutation of domino numbers with the undrawn ones first, then for each
+board its cells as tile codes, its union find parents and sizes, and a
+bitmap of discarded domino numbers. Every field fits in a byte, so a
+copy is a single bytes copy, hashing is hashing the bytes, and a state
+can be shared with other processes through shared memory without
+pickling.
+"""
+import array
+import random
+import struct
+import typing
+from multiprocessing import shared_memory
+
+import catalogue
+from game import (
+    Board,
+    Deck,
+    Dominoes,
+    Game,
+    Line,
+    Phase,
+    Player,
+    Point,
+    Rule,
+    Suit,
+)
+
+# phase, turn, players, rules, max_size, deck_size, undrawn, draw_num
+HEADER = struct.Struct("<8B")
+LINE_SIZE = 4
+NONE = 0xFF
+EMPTY = 0xFF
+CASTLE = catalogue.SUITS.index(Suit.CASTLE) * (catalogue.MAX_CROWNS + 1)
+PHASES: typing.Tuple[Phase, ...] = tuple(Phase)
+
+
+class Layout(typing.NamedTuple):
+    """Where each field is in a buffer."""
+    players: int
+    max_size: int
+    deck_size: int
+
+    @property
+    def cells(self) -> int:
+        return self.max_size * self.max_size
+
+    @property
+    def order(self) -> int:
+        return HEADER.size
+
+    @property
+    def line(self) -> int:
+        # Each player has two kings in two player games.
+        return self.order + self.players * 2
+
+    @property
+    def deck(self) -> int:
+        return self.line + LINE_SIZE * 2
+
+    @property
+    def discards(self) -> int:
+        """Bytes in a bitmap of domino numbers."""
+        return len(catalogue.CATALOGUE) // 8 + 1
+
+    @property
+    def board_size(self) -> int:
+        return self.cells * 3 + self.discards
+
+    def board(self, player: int) -> int:
+        return self.deck + self.deck_size + player * self.board_size
+
+    @property
+    def size(self) -> int:
+        return self.board(self.players)
+
+
+class State:
+    """A game as bytes, in a bytearray or in shared memory."""
+    __slots__ = ("buffer", "layout", "memory")
+
+    def __init__(
+        self,
+        buffer: typing.Union[bytearray, memoryview],
+        memory: shared_memory.SharedMemory=None,
+    ):
+        _, _, players, _, max_size, deck_size, _, _ = HEADER.unpack_from(buffer)
+        self.layout = Layout(players, max_size, deck_size)
+        # Shared memory can be rounded up to a whole page.
+        if len(buffer) > self.layout.size:
+            buffer = memoryview(buffer)[:self.layout.size]
+        self.buffer = buffer
+        self.memory = memory
+
+    @classmethod
+    def from_game(cls, game: Game) -> "State":
+        players = game.players
+        board = game.boards[players[0]]
+        layout = Layout(len(players), board.grid.max_size, game.deck.deck_size)
+        buffer = bytearray(layout.size)
+
+        HEADER.pack_into(
+            buffer,
+            0,
+            PHASES.index(game.phase),
+            game.turn_num,
+            len(players),
+            game.rules.value,
+            layout.max_size,
+            layout.deck_size,
+            len(game.deck.deck),
+            game.deck.draw_num,
+        )
+
+        order = [players.index(player) for player in game.order]
+        order += [NONE] * (layout.players * 2 - len(order))
+        buffer[layout.order:layout.line] = bytes(order)
+
+        line = []
+        for owner, domino in game.line.line:
+            line += [domino.number, NONE if owner is None else players.index(owner)]
+        line += [0, NONE] * (LINE_SIZE - len(game.line.line))
+        buffer[layout.line:layout.deck] = bytes(line)
+
+        deck = game.deck.deck + game.deck.drawn
+        buffer[layout.deck:layout.deck + len(deck)] = bytes(
+            domino.number for domino in deck
+        )
+
+        for i, player in enumerate(players):
+            _pack_board(buffer, layout, layout.board(i), game.boards[player])
+        return cls(buffer)
+
+    def _header(self) -> typing.Tuple[int, ...]:
+        return HEADER.unpack_from(self.buffer)
+
+    @property
+    def phase(self) -> Phase:
+        return PHASES[self.buffer[0]]
+
+    @property
+    def turn_num(self) -> int:
+        return self.buffer[1]
+
+    @property
+    def rules(self) -> Rule:
+        return Rule(self.buffer[3])
+
+    def order(self) -> typing.List[int]:
+        layout = self.layout
+        return [
+            player for player in self.buffer[layout.order:layout.line]
+            if player != NONE
+        ]
+
+    def line(self) -> typing.List[typing.Tuple[typing.Optional[int], int]]:
+        """Returns (player index or None, domino number) pairs."""
+        layout = self.layout
+        data = self.buffer[layout.line:layout.deck]
+        return [
+            (None if owner == NONE else owner, number)
+            for number, owner in zip(data[::2], data[1::2])
+            if number
+        ]
+
+    def board(self, player: int, dominoes: Dominoes, rules: Rule=None) -> Board:
+        """Returns the board of the player with the given index, with its
+        discards in number order."""
+        if rules is None:
+            rules = self.rules
+        layout = self.layout
+        start = layout.board(player)
+        cells = self.buffer[start:start + layout.cells]
+        parents = self.buffer[start + layout.cells:start + layout.cells * 2]
+        sizes = self.buffer[start + layout.cells * 2:start + layout.cells * 3]
+        discards = self.buffer[start + layout.cells * 3:start + layout.board_size]
+
+        board = Board(rules)
+        union = board.union
+        union.parent = array.array("i", list(parents))
+        union.size = array.array("i", list(sizes))
+        for index, code in enumerate(cells):
+            if code == EMPTY or code == CASTLE:
+                continue
+            tile = catalogue.decode_tile(code)
+            board.grid[Point(*divmod(index, layout.max_size))] = tile
+            union.member[index] = 1
+            # Only roots gain weight on a join, so every item weighs the
+            # crowns of the tree below it.
+            item = index
+            while True:
+                union.weight[item] += tile.crowns
+                if union.parent[item] == item:
+                    break
+                item = union.parent[item]
+        for root in union.roots():
+            union.score += union.weight[root] * union.size[root]
+            union.total_weight += union.weight[root]
+
+        board.discards = [
+            dominoes[number - 1]
+            for number in range(1, len(discards) * 8)
+            if discards[number // 8] >> number % 8 & 1
+        ]
+        board.frontier = board._search_frontier()
+        return board
+
+    def to_game(
+        self,
+        dominoes: Dominoes,
+        players: typing.List[Player],
+        rng: random.Random=None,
+    ) -> Game:
+        """Returns a game in this state, with dominoes given by number - 1."""
+        if rng is None:
+            rng = random.Random()
+        phase, turn_num, _, rules, _, deck_size, undrawn, draw_num = self._header()
+        layout = self.layout
+
+        game = Game.__new__(Game)
+        game.rng = rng
+        game.dominoes = dominoes
+        game.players = players
+        game.rules = Rule(rules)
+        game.phase = PHASES[phase]
+        game.turn_num = turn_num
+
+        numbers = self.buffer[layout.deck:layout.deck + deck_size]
+        deck = Deck.__new__(Deck)
+        deck.deck_size = deck_size
+        deck.draw_num = draw_num
+        deck.deck = [dominoes[number - 1] for number in numbers[:undrawn]]
+        deck.drawn = [dominoes[number - 1] for number in numbers[undrawn:]]
+        game.deck = deck
+
+        game.boards = {
+            player: self.board(i, dominoes, game.rules)
+            for i, player in enumerate(players)
+        }
+        game.order = [players[i] for i in self.order()]
+        game.line = Line([])
+        game.line.line = [
+            [None if owner is None else players[owner], dominoes[number - 1]]
+            for owner, number in self.line()
+        ]
+        return game
+
+    def copy(self) -> "State":
+        return State(bytearray(self.buffer))
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.buffer)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, State):
+            return NotImplemented
+        return self.buffer == other.buffer
+
+    def __hash__(self) -> int:
+        return hash(bytes(self.buffer))
+
+    def share(self) -> "State":
+        """Returns a copy in new shared memory, which the caller must close
+        and unlink."""
+        memory = shared_memory.SharedMemory(create=True, size=len(self.buffer))
+        memory.buf[:len(self.buffer)] = self.buffer
+        return State(memory.buf, memory)
+
+    @classmethod
+    def attach(cls, name: str) -> "State":
+        """Returns the state in the shared memory named name, without
+        copying it."""
+        memory = shared_memory.SharedMemory(name=name)
+        return cls(memory.buf, memory)
+
+    @property
+    def name(self) -> typing.Optional[str]:
+        return self.memory.name if self.memory is not None else None
+
+    def close(self) -> None:
+        if self.memory is not None:
+            if isinstance(self.buffer, memoryview):
+                self.buffer.release()
+            self.memory.close()
+
+    def unlink(self) -> None:
+        if self.memory is not None:
+            self.memory.unlink()
+
+
+def _pack_board(buffer: bytearray, layout: Layout, start: int, board: Board) -> None:
+    cells = bytearray([EMPTY]) * layout.cells
+    for x, row in enumerate(board.grid.grid):
+        for y, tile in enumerate(row):
+            if tile is not None:
+                cells[x * layout.max_size + y] = catalogue.encode_tile(tile)
+
+    discards = bytearray(layout.discards)
+    for domino in board.discards:
+        discards[domino.number // 8] |= 1 << domino.number % 8
+
+    union = board.union
+    buffer[start:start + layout.board_size] = (
+        cells
+        + array.array("B", union.parent).tobytes()
+        + array.array("B", union.size).tobytes()
+        + discards
+    )
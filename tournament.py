@@ -0,0 +1,441 @@
+"""Tournaments between bot policies across rule variants.
+
+Every combination of policies that fills a variant's seats is a matchup.
+Shards of games are scheduled across a process pool, always topping up
+the matchup with the fewest games, and each result is folded into
+running statistics as it arrives and then dropped, so memory does not
+grow with the number of games. A matchup stops being scheduled once the
+confidence interval of every pairwise win rate in it either excludes an
+even split or is narrower than the precision asked for.
+
+Elo ratings are kept per variant, multiplayer games counting as a
+result between each pair of different policies.
+"""
+import argparse
+import collections
+import concurrent.futures
+import functools
+import itertools
+import json
+import math
+import os
+import typing
+
+import catalogue
+import simulate
+from game import Rule
+
+Message = typing.Dict[str, typing.Any]
+
+
+class Running:
+    """The count, mean and variance of a stream, by Welford's method."""
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stderr(self) -> float:
+        return math.sqrt(self.variance / self.count) if self.count else math.inf
+
+    def interval(self, z: float) -> typing.Tuple[float, float]:
+        """Returns the normal confidence interval of the mean."""
+        half = z * self.stderr
+        return self.mean - half, self.mean + half
+
+
+class Distribution:
+    """Running statistics of scores, with a histogram in bins of width."""
+
+    def __init__(self, width: int=10):
+        self.width = width
+        self.running = Running()
+        self.bins: typing.Counter[int] = collections.Counter()
+
+    def add(self, points: int) -> None:
+        self.running.add(points)
+        self.bins[points // self.width * self.width] += 1
+
+    def to_dict(self) -> Message:
+        running = self.running
+        return {
+            "games": running.count,
+            "mean": running.mean,
+            "stdev": math.sqrt(running.variance),
+            "min": running.min,
+            "max": running.max,
+            "histogram": {
+                str(start): count
+                for start, count in sorted(self.bins.items())
+            },
+        }
+
+
+class Elo:
+
+    def __init__(self, k: float=16, initial: float=1500):
+        self.k = k
+        self.initial = initial
+        self.ratings: typing.Dict[str, float] = {}
+
+    def rating(self, name: str) -> float:
+        return self.ratings.get(name, self.initial)
+
+    def expected(self, a: str, b: str) -> float:
+        """Returns the expected score of a against b."""
+        return 1 / (1 + 10 ** ((self.rating(b) - self.rating(a)) / 400))
+
+    def update(
+        self,
+        outcomes: typing.Iterable[typing.Tuple[str, str, float]],
+        policies: int=2,
+    ) -> None:
+        """Applies the (a, b, score of a) results of one game at once, each
+        weighing 1 / (policies - 1) of a two player game."""
+        k = self.k / (policies - 1)
+        deltas: typing.Counter[str] = collections.Counter()
+        for a, b, score in outcomes:
+            change = k * (score - self.expected(a, b))
+            deltas[a] += change
+            deltas[b] -= change
+        for name, change in deltas.items():
+            self.ratings[name] = self.rating(name) + change
+
+
+class Variant(typing.NamedTuple):
+    name: str
+    rules: Rule
+    players: int
+
+    @classmethod
+    def parse(cls, name: str) -> "Variant":
+        """Parses rule names joined by "+", e.g. "two_players+harmony"."""
+        rules = simulate.parse_rules(name.split("+"))
+        assert rules is not None
+        if Rule.FOUR_PLAYERS in rules:
+            players = 4
+        elif Rule.THREE_PLAYERS in rules:
+            players = 3
+        else:
+            players = 2
+        counts = (Rule.TWO_PLAYERS, Rule.THREE_PLAYERS, Rule.FOUR_PLAYERS)
+        if len([rule for rule in counts if rule in rules]) > 1:
+            raise ValueError(f"{name} has more than one number of players")
+        if Rule.MIGHTY_DUEL in rules and players != 2:
+            raise ValueError(f"{name} is a two player variant")
+        return cls(name, rules, players)
+
+
+def _outcome(a: typing.Tuple[int, int], b: typing.Tuple[int, int]) -> float:
+    """Returns the score of a against b, on points then crowns."""
+    if a == b:
+        return 0.5
+    return float(a > b)
+
+
+class Matchup:
+    """Policies seated together in one variant, and how they fared."""
+
+    def __init__(self, variant: Variant, policies: typing.Tuple[str, ...]):
+        self.variant = variant
+        self.policies = policies
+        self.scheduled = 0
+        self.running = 0
+        self.played = 0
+        self.reason: typing.Optional[str] = None
+        # Win rate of the first policy of each pair against the second.
+        self.pairs: typing.Dict[typing.Tuple[str, str], Running] = {
+            pair: Running()
+            for pair in itertools.combinations(sorted(set(policies)), 2)
+        }
+
+    def outcomes(
+        self,
+        results: typing.Sequence[typing.Tuple[int, int]],
+    ) -> typing.Iterator[typing.Tuple[str, str, float]]:
+        """Yields (a, b, score of a) for each pair of different policies, a
+        sorting before b. A policy in more than one seat scores the mean
+        over its seats, so each pair adds one sample per game."""
+        for a, b in self.pairs:
+            scores = [
+                _outcome(results[i], results[j])
+                for i, policy in enumerate(self.policies) if policy == a
+                for j, other in enumerate(self.policies) if other == b
+            ]
+            yield a, b, sum(scores) / len(scores)
+
+    def add(self, outcomes: typing.Iterable[typing.Tuple[str, str, float]]) -> None:
+        self.played += 1
+        for a, b, score in outcomes:
+            self.pairs[a, b].add(score)
+
+    def decide(
+        self,
+        z: float,
+        precision: float,
+        min_games: int,
+        max_games: int,
+    ) -> typing.Optional[str]:
+        """Returns why the matchup needs no more games, if it does not."""
+        if self.reason is None:
+            if self.played >= max_games:
+                self.reason = "max_games"
+            elif self.played >= min_games:
+                low_high = [pair.interval(z) for pair in self.pairs.values()]
+                if all(low > 0.5 or high < 0.5 for low, high in low_high):
+                    self.reason = "decided"
+                elif all(high - low < precision for low, high in low_high):
+                    self.reason = "precise"
+        return self.reason
+
+    def to_dict(self, z: float) -> Message:
+        return {
+            "type": "matchup",
+            "variant": self.variant.name,
+            "policies": list(self.policies),
+            "games": self.played,
+            "reason": self.reason,
+            "win_rates": {
+                f"{a}>{b}": {
+                    "mean": pair.mean,
+                    "interval": list(pair.interval(z)),
+                }
+                for (a, b), pair in self.pairs.items()
+            },
+        }
+
+
+def matchups(
+    policies: typing.Sequence[str],
+    variants: typing.Sequence[Variant],
+) -> typing.List[Matchup]:
+    """Returns every way of seating at least two different policies in
+    each variant."""
+    return [
+        Matchup(variant, seats)
+        for variant in variants
+        for seats in itertools.combinations_with_replacement(
+            sorted(set(policies)),
+            variant.players,
+        )
+        if len(set(seats)) > 1
+    ]
+
+
+class Tournament:
+
+    def __init__(
+        self,
+        policies: typing.Sequence[str],
+        variants: typing.Sequence[Variant],
+        seed: int=0,
+        workers: int=None,
+        shard_size: int=8,
+        z: float=1.96,
+        precision: float=0.05,
+        min_games: int=32,
+        max_games: int=10000,
+        k: float=16,
+        filename: str=catalogue.FILENAME,
+    ):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.policies = {name: simulate.POLICIES[name]() for name in policies}
+        self.variants = variants
+        self.matchups = matchups(policies, variants)
+        self.seed = seed
+        self.workers = workers
+        self.shard_size = shard_size
+        self.z = z
+        self.precision = precision
+        self.min_games = min_games
+        self.max_games = max_games
+        self.filename = filename
+        self.elo = {variant.name: Elo(k) for variant in variants}
+        self.scores = {
+            (variant.name, name): Distribution()
+            for variant in variants
+            for name in self.policies
+        }
+
+    def _next(self) -> typing.Optional[Matchup]:
+        """Returns the open matchup with the fewest games scheduled."""
+        open_matchups = [
+            matchup for matchup in self.matchups
+            if matchup.reason is None and matchup.scheduled < self.max_games
+        ]
+        if not open_matchups:
+            return None
+        return min(open_matchups, key=lambda matchup: matchup.scheduled)
+
+    def _submit(
+        self,
+        executor: typing.Optional[concurrent.futures.Executor],
+        matchup: Matchup,
+    ) -> concurrent.futures.Future:
+        start = matchup.scheduled
+        indices = range(start, min(start + self.shard_size, self.max_games))
+        matchup.scheduled = indices.stop
+        matchup.running += 1
+        play_shard = functools.partial(
+            simulate._play_shard,
+            [self.policies[name] for name in matchup.policies],
+            matchup.variant.rules,
+            self.seed,
+            False,
+            indices,
+        )
+        if executor is not None:
+            return executor.submit(play_shard)
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        future.set_result(play_shard())
+        return future
+
+    def _record(self, matchup: Matchup, result: simulate.GameResult) -> None:
+        outcomes = list(matchup.outcomes(list(zip(result.points, result.crowns))))
+        matchup.add(outcomes)
+        self.elo[matchup.variant.name].update(outcomes, len(set(matchup.policies)))
+        for name, points in zip(matchup.policies, result.points):
+            self.scores[matchup.variant.name, name].add(points)
+
+    def run(self) -> typing.Iterator[Message]:
+        """Plays games until every matchup is finished, yielding a report
+        as each one finishes and the ratings at the end."""
+        executor: typing.Optional[concurrent.futures.Executor] = None
+        if self.workers == 1:
+            simulate._init_worker(self.filename)
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=simulate._init_worker,
+                initargs=(self.filename,),
+            )
+        # Enough shards in flight to keep every worker busy.
+        limit = self.workers * 2
+        in_flight: typing.Dict[concurrent.futures.Future, Matchup] = {}
+        try:
+            while True:
+                while len(in_flight) < limit:
+                    matchup = self._next()
+                    if matchup is None:
+                        break
+                    in_flight[self._submit(executor, matchup)] = matchup
+                if not in_flight:
+                    break
+                done, _ = concurrent.futures.wait(
+                    in_flight,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                for future in done:
+                    matchup = in_flight.pop(future)
+                    matchup.running -= 1
+                    for result in future.result():
+                        self._record(matchup, result)
+                    matchup.decide(
+                        self.z,
+                        self.precision,
+                        self.min_games,
+                        self.max_games,
+                    )
+                    if matchup.reason is not None and not matchup.running:
+                        yield matchup.to_dict(self.z)
+        finally:
+            if executor is not None:
+                for future in in_flight:
+                    future.cancel()
+                executor.shutdown()
+        yield self.ratings()
+
+    def ratings(self) -> Message:
+        return {
+            "type": "ratings",
+            "variants": {
+                variant.name: {
+                    name: {
+                        "elo": self.elo[variant.name].rating(name),
+                        "points": self.scores[variant.name, name].to_dict(),
+                    }
+                    for name in sorted(
+                        self.policies,
+                        key=self.elo[variant.name].rating,
+                        reverse=True,
+                    )
+                }
+                for variant in self.variants
+            },
+        }
+
+
+def main(argv: typing.List[str]=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Rate bot policies against each other across rule variants.",
+    )
+    parser.add_argument(
+        "--policies",
+        nargs="+",
+        default=["random", "greedy"],
+        choices=sorted(simulate.POLICIES),
+    )
+    parser.add_argument(
+        "--variants",
+        nargs="+",
+        # argparse only applies type to string defaults, not lists.
+        default=[Variant.parse("two_players")],
+        type=Variant.parse,
+        help="rule names joined by +, e.g. two_players+harmony",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=8)
+    parser.add_argument(
+        "--z",
+        type=float,
+        default=1.96,
+        help="standard errors in each half of a confidence interval",
+    )
+    parser.add_argument(
+        "--precision",
+        type=float,
+        default=0.05,
+        help="width of win rate interval at which a matchup stops",
+    )
+    parser.add_argument("--min-games", type=int, default=32)
+    parser.add_argument("--max-games", type=int, default=10000)
+    parser.add_argument("--k", type=float, default=16, help="Elo K factor")
+    args = parser.parse_args(argv)
+
+    tournament = Tournament(
+        policies=args.policies,
+        variants=args.variants,
+        seed=args.seed,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        z=args.z,
+        precision=args.precision,
+        min_games=args.min_games,
+        max_games=args.max_games,
+        k=args.k,
+    )
+    for report in tournament.run():
+        print(json.dumps(report), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import collections
+import typing
+
+K = typing.TypeVar('K')
+V = typing.TypeVar('V')
+
+
+class Entry(typing.NamedTuple):
+    key: typing.Hashable
+    value: typing.Any
+    depth: int
+
+
+class LRUTable:
+    """A transposition table that evicts the least recently used entry."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+
+    def get(self, key: K, default: V=None) -> typing.Optional[V]:
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: K, value: V, depth: int=0) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DepthTable:
+    """A transposition table with one slot per key hash, where an entry is
+    only replaced by one searched at least as deep."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._slots: typing.List[typing.Optional[Entry]] = [None] * capacity
+
+    def get(self, key: K, default: V=None) -> typing.Optional[V]:
+        entry = self._slots[hash(key) % self.capacity]
+        if entry is None or entry.key != key:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return entry.value
+
+    def put(self, key: K, value: V, depth: int=0) -> None:
+        slot = hash(key) % self.capacity
+        entry = self._slots[slot]
+        if entry is None or entry.key == key or depth >= entry.depth:
+            self._slots[slot] = Entry(key, value, depth)
+
+    def __contains__(self, key: object) -> bool:
+        entry = self._slots[hash(key) % self.capacity]
+        return entry is not None and entry.key == key
+
+    def __len__(self) -> int:
+        return sum(entry is not None for entry in self._slots)
+
+
+Table = typing.Union[LRUTable, DepthTable]
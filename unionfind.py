@@ -1,8 +1,10 @@
+import array
 import typing
 
 T = typing.TypeVar('T')
 
 class Node:
+    __slots__ = ("item", "parent", "size")
 
     def __init__(
         self,
@@ -29,8 +31,8 @@ class Node:
             return (
                 f"{self.__class__.__name__}("
                 + ", ".join(
-                    f"{key}={value!r}"
-                    for key, value in self.__dict__.items()
+                    f"{key}={getattr(self, key)!r}"
+                    for key in self.__slots__
                 )
                 + ")"
             )
@@ -94,6 +96,133 @@ class UnionFind:
         return f"{self.__class__.__name__}(_nodes={self._nodes!r})"
 
 
+class ArrayUnionFind:
+    """A union find over the integers 0..capacity-1 stored in flat arrays.
+
+    Items belong to a group once added with a weight (e.g. crowns on a
+    tile). Each root keeps the size and total weight of its group, and the
+    sum over groups of weight * size is kept up to date on every join.
+
+    Joins are by size without path compression, so every join can be
+    taken back with rollback.
+    """
+    __slots__ = (
+        "parent",
+        "size",
+        "weight",
+        "member",
+        "score",
+        "total_weight",
+        "log",
+    )
+
+    def __init__(self, capacity: int):
+        self.parent = array.array("i", range(capacity))
+        self.size = array.array("i", [1]) * capacity
+        self.weight = array.array("i", [0]) * capacity
+        self.member = array.array("b", [0]) * capacity
+        self.score = 0
+        self.total_weight = 0
+        self.log: typing.List[int] = []
+
+    def copy(self) -> "ArrayUnionFind":
+        new = self.__class__.__new__(self.__class__)
+        new.parent = self.parent[:]
+        new.size = self.size[:]
+        new.weight = self.weight[:]
+        new.member = self.member[:]
+        new.score = self.score
+        new.total_weight = self.total_weight
+        new.log = list(self.log)
+        return new
+
+    def add(self, item: int, weight: int=0) -> None:
+        """Adds an item as a group of its own."""
+        self.member[item] = 1
+        self.weight[item] = weight
+        self.score += weight
+        self.total_weight += weight
+
+    def remove(self, item: int) -> None:
+        """Removes an added item that is in a group of its own."""
+        self.score -= self.weight[item]
+        self.total_weight -= self.weight[item]
+        self.member[item] = 0
+        self.weight[item] = 0
+
+    def find(self, item: int) -> int:
+        parent = self.parent
+        while parent[item] != item:
+            item = parent[item]
+        return item
+
+    def join(self, x: int, y: int) -> None:
+        root_x = self.find(x)
+        root_y = self.find(y)
+
+        if root_x == root_y:
+            return
+
+        size = self.size
+        weight = self.weight
+
+        if size[root_x] < size[root_y]:
+            root_x, root_y = root_y, root_x
+
+        self.score -= weight[root_x] * size[root_x] + weight[root_y] * size[root_y]
+
+        self.parent[root_y] = root_x
+        size[root_x] += size[root_y]
+        weight[root_x] += weight[root_y]
+        self.log.append(root_y)
+
+        self.score += weight[root_x] * size[root_x]
+
+    def checkpoint(self) -> int:
+        return len(self.log)
+
+    def rollback(self, checkpoint: int) -> None:
+        """Undoes every join made since checkpoint, latest first."""
+        size = self.size
+        weight = self.weight
+        while len(self.log) > checkpoint:
+            root_y = self.log.pop()
+            root_x = self.parent[root_y]
+
+            self.score -= weight[root_x] * size[root_x]
+
+            self.parent[root_y] = root_y
+            size[root_x] -= size[root_y]
+            weight[root_x] -= weight[root_y]
+
+            self.score += weight[root_x] * size[root_x] + weight[root_y] * size[root_y]
+
+    def roots(self) -> typing.List[int]:
+        return [
+            item for item, parent in enumerate(self.parent)
+            if item == parent and self.member[item]
+        ]
+
+    def regions(self) -> typing.List[typing.Tuple[int, int]]:
+        """Returns the (weight, size) of every group."""
+        return [
+            (self.weight[root], self.size[root])
+            for root in self.roots()
+        ]
+
+    def groups(self) -> typing.FrozenSet[typing.FrozenSet[int]]:
+        d: typing.Dict[int, set] = {root: set() for root in self.roots()}
+        for item in range(len(self.parent)):
+            root = self.find(item)
+            if root in d:
+                d[root].add(item)
+        return frozenset(frozenset(items) for items in d.values())
+
+    def __str__(self) -> str:
+        return str(self.groups())
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(capacity={len(self.parent)})"
 
 
 if __name__ == "__main__":